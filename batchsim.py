@@ -0,0 +1,658 @@
+from __future__ import annotations
+from typing import Tuple
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+# NumPy is only needed by this module, the game itself does not depend on it.
+import numpy as np
+
+import engine
+from boardstate import EMPTY
+from cards import CARDS, Deck
+from geometry import getGeometry, CARD_DISTANCES
+from hand import BitHand
+from player import Player
+from params import *
+
+# Batched simulator: B games are played in lockstep, their state being held in arrays (one row per game) so that the legal
+# moves of every game, and the effect of the chosen moves, are computed with a few NumPy operations per turn instead of
+# going through the Board/Spot/Move objects. The rules follow the ones of engine.py (and Board.getMoveOptions /
+# Board.isMoveValid), including folding, seven splits and the takeover of the teammate's pieces. Any change to the rules of
+# the engine has to be made here as well, which checkParity (--check-parity) helps to verify: it compares the legal moves
+# found here with the ones of the engine on random positions.
+#
+# Seat s plays color s (the board is created with the colors in seat order, as Game does), and belongs to team s % 2.
+# Card c is VALUES[c // 4] of SUITS[c % 4], the order in which Deck creates them.
+
+NUM_SEATS = NUMBER_OF_PLAYERS
+NUM_SPOTS = SPOTS_PER_REGION * NUM_SEATS
+NUM_HOUSES = SPOTS_PER_HOUSE * NUM_SEATS
+NUM_VALUES = len(VALUES)
+NUM_CARDS = len(SUITS) * NUM_VALUES
+MAX_DISTANCE = 13
+
+# A player never has more than 4 pieces on the spots, the actions are therefore indexed by piece slot rather than by spot:
+# slot i being the i-th spot (in spot order) occupied by the pieces the active player moves.
+NUM_PIECES = SPOTS_PER_HOUSE
+
+# kinds of moves in the main action array, which is indexed by (card value, kind, piece slot)
+KIND_MOVE1 = 0   # move forward by the first distance of the card
+KIND_MOVE2 = 1   # move forward by the second distance of the card (the 11 of an A)
+KIND_BACK = 2    # move back 4 spots (4)
+KIND_ENTER1 = 3  # enter a house with the first distance of the card
+KIND_ENTER2 = 4  # enter a house with the second distance of the card
+KIND_OUT = 5     # take a piece out (A, K), on slot 0 whatever the pieces are
+NUM_KINDS = 6
+NUM_MAIN_ACTIONS = NUM_VALUES * NUM_KINDS * NUM_PIECES
+NUM_SWITCH_ACTIONS = NUM_PIECES * NUM_SPOTS
+
+VALUE_INDEX = {value: index for index, value in enumerate(VALUES)}
+VALUE_J = VALUE_INDEX['J']
+VALUE_7 = VALUE_INDEX['7']
+
+# forward distances (0 when the card does not have one), backward and "take out" abilities of each card value
+DISTANCES = np.zeros((NUM_VALUES, 2), dtype=np.int64)
+CAN_GO_BACK = np.zeros(NUM_VALUES, dtype=bool)
+CAN_TAKE_OUT = np.zeros(NUM_VALUES, dtype=bool)
+for _value, (_forward, _backward, _canTakeOut) in CARD_DISTANCES.items():
+	if _value in VALUE_INDEX:
+		DISTANCES[VALUE_INDEX[_value], :len(_forward)] = _forward
+		CAN_GO_BACK[VALUE_INDEX[_value]] = len(_backward) > 0
+		CAN_TAKE_OUT[VALUE_INDEX[_value]] = _canTakeOut
+
+# HOUSES[color, spot, distance] is the house reached (or -1), straight from the geometry tables of the Board
+_geometry = getGeometry(COLORS)
+HOUSES = np.full((NUM_SEATS, NUM_SPOTS, MAX_DISTANCE + 1), -1, dtype=np.int64)
+for _color in range(NUM_SEATS):
+	for _spot in range(NUM_SPOTS):
+		for _distance in range(1, MAX_DISTANCE + 1):
+			_house = _geometry.house(_color, _spot, _distance)
+			if _house is not None:
+				HOUSES[_color, _spot, _distance] = _house
+# spot from which a one-step move enters each house (-1 if none), per color
+ENTRY_SPOTS = np.full((NUM_SEATS, NUM_HOUSES), -1, dtype=np.int64)
+for _color in range(NUM_SEATS):
+	for _spot in range(NUM_SPOTS):
+		if HOUSES[_color, _spot, 1] >= 0:
+			ENTRY_SPOTS[_color, HOUSES[_color, _spot, 1]] = _spot
+FIRST_SPOTS = np.arange(NUM_SEATS) * SPOTS_PER_REGION
+HOUSE_FIRST_SPOTS = (np.arange(NUM_HOUSES) // SPOTS_PER_HOUSE) * SPOTS_PER_REGION
+# HOUSES_BEFORE[h, h2] is True when h2 is a house of the same color as h which comes before it
+HOUSES_BEFORE = np.array([[h2 // SPOTS_PER_HOUSE == h // SPOTS_PER_HOUSE and h2 < h for h2 in range(NUM_HOUSES)] for h in range(NUM_HOUSES)])
+HOUSES_AFTER = HOUSES_BEFORE.T
+
+# position codes used by the seven split search: 0-67 for spots, 68-83 for houses, UNUSED for an empty piece slot
+HOUSE_OFFSET = NUM_SPOTS
+UNUSED = 127
+SEVEN_STEPS = 7
+
+# Number of cards dealt to each player for each of the three rounds of a deck (see Game.play)
+ROUNDS = [5, 4, 4]
+
+
+def teammateOf(seats : np.ndarray) -> np.ndarray:
+	return (seats + 2) % NUM_SEATS
+
+
+def jammedColors(houses : np.ndarray) -> np.ndarray:
+	# (n, NUM_SEATS) mask of the colors which can never fill their houses any more: a house can only be entered while the
+	# ones before it are empty, and a piece in a house never moves again, so an empty house with a filled one before it
+	# stays empty for good.
+	occupied = houses >= 0
+	housesBeforeOccupied = (occupied[:, None, :] & HOUSES_BEFORE[None, :, :]).any(axis=2)
+	return (~occupied & housesBeforeOccupied).reshape(len(houses), NUM_SEATS, SPOTS_PER_HOUSE).any(axis=2)
+
+
+class BatchGames:
+	# As in Game.play, the deck is reshuffled and the next player deals after every third round. A game is over when it is
+	# won, when no team can fill its houses any more (stalled) or after maxRounds rounds.
+	def __init__(self, batchSize : int, seed : int = 0, maxRounds : int = SIMULATION_MAX_ROUNDS):
+		self.rng = np.random.default_rng(seed)
+		self.size = batchSize
+		self.maxRounds = maxRounds
+		B = batchSize
+		self.occupant = np.full((B, NUM_SPOTS), -1, dtype=np.int8)
+		self.blocking = np.zeros((B, NUM_SPOTS), dtype=bool)
+		self.houses = np.full((B, NUM_HOUSES), -1, dtype=np.int8)
+		self.hands = np.zeros((B, NUM_SEATS, NUM_CARDS), dtype=bool)
+		self.deck = np.argsort(self.rng.random((B, NUM_CARDS)), axis=1)
+		self.deckCursor = np.zeros(B, dtype=np.int64)
+		self.dealer = np.zeros(B, dtype=np.int64)
+		self.active = np.full(B, -1, dtype=np.int64)
+		self.handsFinished = np.zeros(B, dtype=np.int64)
+		self.rounds = np.zeros(B, dtype=np.int64)
+		self.roundStarted = np.zeros(B, dtype=bool)
+		self.finished = np.zeros(B, dtype=bool)
+		self.stalled = np.zeros(B, dtype=bool)
+		self.takenOver = np.zeros((B, NUM_SEATS), dtype=bool)
+		self.winner = np.full(B, -1, dtype=np.int64)
+		self.turns = np.zeros(B, dtype=np.int64)
+		self.folds = np.zeros(B, dtype=np.int64)
+		self.kicks = np.zeros(B, dtype=np.int64)
+
+	@property
+	def over(self) -> np.ndarray:
+		return self.finished | self.stalled | (self.rounds >= self.maxRounds)
+
+	@property
+	def capped(self) -> np.ndarray:
+		return ~self.finished & ~self.stalled & (self.rounds >= self.maxRounds)
+
+	def piecesOnTheBoard(self, games : np.ndarray, seats : np.ndarray) -> np.ndarray:
+		# as Player.piecesOnTheBoard, the pieces of a seat on the spots and in the houses
+		return (self.occupant[games] == seats[:, None]).sum(axis=1) + (self.houses[games] == seats[:, None]).sum(axis=1)
+
+	def owners(self, games : np.ndarray) -> np.ndarray:
+		# the seat whose pieces the active player moves (the teammate's once the player has filled his/her houses)
+		seats = self.active[games]
+		return np.where(self.takenOver[games, seats], teammateOf(seats), seats)
+
+	# --- legal moves ---
+
+	def pieceSlots(self, games : np.ndarray, owners : np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+		# spots of the pieces of the owners (n, NUM_PIECES), and whether each slot holds a piece
+		mine = self.occupant[games] == owners[:, None]
+		slotSpots = np.argsort(~mine, axis=1, kind='stable')[:, :NUM_PIECES]
+		return slotSpots, np.take_along_axis(mine, slotSpots, axis=1)
+
+	def legalMoves(self, games : np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict, np.ndarray]:
+		# Returns, for the active player of each of the given games: the main action mask (n, values, kinds, slots), the
+		# SWITCH mask (n, slot, target spot), the SEVEN mask (n,), the seven split outcomes of the games where it is legal
+		# and the spots of the piece slots.
+		n = len(games)
+		rows = np.arange(n)
+		seats = self.active[games]
+		owners = self.owners(games)
+		occupant = self.occupant[games]
+		blocking = self.blocking[games]
+		hasValue = self.hands[games, seats].reshape(n, NUM_VALUES, len(SUITS)).any(axis=2)
+		slotSpots, slotUsed = self.pieceSlots(games, owners)
+
+		# number of blocking spots in (x, x + d] and in [x - 4, x), from cumulative sums over the board repeated twice
+		blockingCount = np.concatenate([np.zeros((n, 1), dtype=np.int64), np.cumsum(np.tile(blocking, 2), axis=1)], axis=1)
+		distances = np.arange(MAX_DISTANCE + 1)
+		slotCount = blockingCount[rows[:, None], slotSpots + 1]
+		pathFree = (blockingCount[rows[:, None, None], slotSpots[:, :, None] + distances[None, None, :] + 1] - slotCount[:, :, None]) == 0
+		backFree = (blockingCount[rows[:, None], slotSpots + NUM_SPOTS] - blockingCount[rows[:, None], slotSpots + NUM_SPOTS - 4]) == 0
+
+		houseOccupied = self.houses[games] >= 0
+		housesBeforeOccupied = (houseOccupied[:, None, :] & HOUSES_BEFORE[None, :, :]).any(axis=2)
+		houseEnterable = ~blocking[:, HOUSE_FIRST_SPOTS] & ~housesBeforeOccupied
+		slotHouses = HOUSES[owners[:, None], slotSpots]
+		slotEnterable = (slotHouses >= 0) & houseEnterable[rows[:, None, None], np.maximum(slotHouses, 0)]
+
+		main = np.zeros((n, NUM_VALUES, NUM_KINDS, NUM_PIECES), dtype=bool)
+		for slot, (moveKind, enterKind) in enumerate([(KIND_MOVE1, KIND_ENTER1), (KIND_MOVE2, KIND_ENTER2)]):
+			d = DISTANCES[:, slot]
+			hasDistance = (d > 0)[None, :, None] & hasValue[:, :, None] & slotUsed[:, None, :]
+			main[:, :, moveKind, :] = hasDistance & pathFree[:, :, d].transpose(0, 2, 1)
+			main[:, :, enterKind, :] = hasDistance & slotEnterable[:, :, d].transpose(0, 2, 1)
+		main[:, :, KIND_BACK, :] = CAN_GO_BACK[None, :, None] & hasValue[:, :, None] & (slotUsed & backFree)[:, None, :]
+		piecesOnTheBoard = self.piecesOnTheBoard(games, owners)
+		canTakeOut = ~blocking[rows, FIRST_SPOTS[owners]] & (piecesOnTheBoard != NUM_PIECES)
+		main[:, :, KIND_OUT, 0] = CAN_TAKE_OUT[None, :] & hasValue & canTakeOut[:, None]
+
+		others = (occupant >= 0) & (occupant != owners[:, None])
+		switchable = slotUsed & ~blocking[rows[:, None], slotSpots]
+		switch = hasValue[:, VALUE_J, None, None] & switchable[:, :, None] & (others & ~blocking)[:, None, :]
+
+		seven = np.zeros(n, dtype=bool)
+		candidates = np.nonzero(hasValue[:, VALUE_7] & (piecesOnTheBoard != 0))[0]
+		outcomeRows, *sevenOutcomes = self._sevenOutcomes(games[candidates], owners[candidates])
+		outcomeRows = candidates[outcomeRows]
+		seven[outcomeRows] = True
+		return main, switch, seven, (outcomeRows, *sevenOutcomes), slotSpots
+
+	# --- seven splits ---
+
+	def _sevenOutcomes(self, games : np.ndarray, owners : np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+		# Breadth-first search of the seven splits of several games at once. A frontier row is one game with the positions of
+		# (up to 4) pieces of the owner and whether they are still alive (a piece stepped on by another piece of the same
+		# player is kicked). Rows are deduplicated at every step, which merges transpositions.
+		# Returns the distinct final positions of all the games, as the index of the game (in games) they belong to, in
+		# increasing order, and the occupant, blocking and houses arrays they lead to. A game without any final
+		# position cannot play its seven.
+		m = len(games)
+		slotSpots, slotUsed = self.pieceSlots(games, owners)
+		startPositions = np.where(slotUsed, slotSpots, UNUSED)
+		# slot of the piece initially in each spot (-1 if none), to know whether an exit spot is still blocking
+		slotAt = np.full((m, NUM_SPOTS + 1), -1, dtype=np.int64)
+		for slot in range(NUM_PIECES):
+			slotAt[np.arange(m), np.where(slotUsed[:, slot], slotSpots[:, slot], NUM_SPOTS)] = slot
+		slotAt = slotAt[:, :NUM_SPOTS]
+		initialBlocking = self.blocking[games]
+		initialHouses = self.houses[games] >= 0
+
+		frontierRow = np.arange(m)
+		positions = startPositions.astype(np.int64)
+		alive = slotUsed.copy()
+		for _ in range(SEVEN_STEPS):
+			if len(frontierRow) == 0:
+				break
+			frontierRow, positions, alive = self._sevenStep(frontierRow, positions, alive, owners, slotAt, initialBlocking, initialHouses)
+
+		occupantF, blockingF, housesF = self._sevenFinalBoards(games, owners, frontierRow, positions, alive, startPositions, slotUsed)
+		keys = np.concatenate([frontierRow[:, None], occupantF, blockingF, housesF], axis=1).astype(np.int32)
+		_, unique = np.unique(keys, axis=0, return_index=True)
+		unique = np.sort(unique)
+		return frontierRow[unique], occupantF[unique], blockingF[unique], housesF[unique]
+
+	def _sevenStep(self, frontierRow, positions, alive, owners, slotAt, initialBlocking, initialHouses):
+		R = len(frontierRow)
+		slots = NUM_PIECES
+		# candidates: every (frontier row, piece slot, step kind), step kind 0 being a one-step MOVE and 1 a one-step ENTER
+		row = np.repeat(np.arange(R), slots * 2)
+		slot = np.tile(np.repeat(np.arange(slots), 2), R)
+		kind = np.tile(np.array([0, 1]), R * slots)
+		game = frontierRow[row]
+		current = positions[row, slot]
+		canStep = alive[row, slot] & (current < NUM_SPOTS)
+		current = np.where(canStep, current, 0)
+
+		def blockedNow(spot):
+			# a spot is blocking if it was at the beginning of the split, unless it held a piece of the owner which has moved since
+			initialSlot = slotAt[game, spot]
+			stillThere = positions[row, np.maximum(initialSlot, 0)] == spot
+			return initialBlocking[game, spot] & ((initialSlot < 0) | stillThere)
+
+		moveTarget = (current + 1) % NUM_SPOTS
+		moveValid = canStep & (kind == 0) & ~blockedNow(moveTarget)
+
+		house = HOUSES[owners[game], current, 1]
+		safeHouse = np.maximum(house, 0)
+		houseOccupiedNow = initialHouses[game] | ((positions[row][:, :, None] == HOUSE_OFFSET + np.arange(NUM_HOUSES)[None, None, :]) & alive[row][:, :, None]).any(axis=1)
+		housesBeforeOccupied = (houseOccupiedNow & HOUSES_BEFORE[safeHouse]).any(axis=1)
+		enterValid = canStep & (kind == 1) & (house >= 0) & ~blockedNow(HOUSE_FIRST_SPOTS[safeHouse]) & ~housesBeforeOccupied
+
+		valid = moveValid | enterValid
+		row, slot, game = row[valid], slot[valid], game[valid]
+		target = np.where(moveValid[valid], moveTarget[valid], HOUSE_OFFSET + safeHouse[valid])
+		newPositions = positions[row].copy()
+		newAlive = alive[row].copy()
+		# any other piece of the owner on the target is kicked
+		newAlive &= ~(newPositions == target[:, None])
+		newPositions[np.arange(len(row)), slot] = target
+		newAlive[np.arange(len(row)), slot] = True
+
+		codes = (newPositions & 0x7F) | (newAlive.astype(np.int64) << 7)
+		keys = (game.astype(np.int64) << 32) | (codes << (8 * np.arange(slots))[None, :]).sum(axis=1)
+		_, unique = np.unique(keys, return_index=True)
+		unique = np.sort(unique)
+		return game[unique], newPositions[unique], newAlive[unique]
+
+	def _sevenFinalBoards(self, games, owners, frontierRow, positions, alive, startPositions, slotUsed):
+		F = len(frontierRow)
+		rows = np.arange(F)
+		game = games[frontierRow]
+		owner = owners[frontierRow]
+		occupant = self.occupant[game].copy()
+		blocking = self.blocking[game].copy()
+		houses = self.houses[game].copy()
+		start = startPositions[frontierRow]
+		used = slotUsed[frontierRow]
+		moved = used & ((positions != start) | ~alive)
+
+		# spots stepped on by each piece: (start, last spot], the last spot of a piece which entered a house being its entry spot
+		inHouse = positions >= HOUSE_OFFSET
+		lastSpot = np.where(inHouse, ENTRY_SPOTS[owner[:, None], np.minimum(np.maximum(positions - HOUSE_OFFSET, 0), NUM_HOUSES - 1)], positions)
+		length = np.where(moved, (lastSpot - start) % NUM_SPOTS, 0)
+		relative = (np.arange(NUM_SPOTS)[None, None, :] - start[:, :, None] - 1) % NUM_SPOTS
+		steppedOn = (relative < length[:, :, None]).any(axis=1)
+
+		# the pieces of the other players which were stepped on are kicked
+		kicked = steppedOn & (occupant >= 0) & (occupant != owner[:, None])
+		occupant[kicked] = -1
+
+		startSpots = np.where(moved, start, NUM_SPOTS)
+		extended = np.concatenate([occupant, np.zeros((F, 1), dtype=occupant.dtype)], axis=1)
+		extendedBlocking = np.concatenate([blocking, np.zeros((F, 1), dtype=bool)], axis=1)
+		extended[rows[:, None], startSpots] = -1
+		extendedBlocking[rows[:, None], startSpots] = False
+		occupant = extended[:, :NUM_SPOTS]
+		blocking = extendedBlocking[:, :NUM_SPOTS]
+
+		onSpot = alive & moved & ~inHouse
+		spotTargets = np.where(onSpot, positions, NUM_SPOTS)
+		extended = np.concatenate([occupant, np.zeros((F, 1), dtype=occupant.dtype)], axis=1)
+		extended[rows[:, None], spotTargets] = np.repeat(owner[:, None], NUM_PIECES, axis=1)
+		occupant = extended[:, :NUM_SPOTS]
+
+		# every house entered during the split is the owner's, whatever was there before
+		entered = (used & inHouse)[:, :, None] & (positions[:, :, None] == HOUSE_OFFSET + np.arange(NUM_HOUSES)[None, None, :])
+		entered = entered.any(axis=1)
+		houses = np.where(entered, owner[:, None], houses).astype(np.int8)
+		return occupant, blocking, houses
+
+	# --- playing ---
+
+	def _dealRound(self, games : np.ndarray) -> None:
+		# deals the hands of the round (from the dealer on, as engine.dealHands) and has teammates exchange a random card. The
+		# deck is reshuffled and the next player deals before the first round of every deck but the first one.
+		newDeck = games[(self.rounds[games] > 0) & (self.rounds[games] % len(ROUNDS) == 0)]
+		self.deck[newDeck] = np.argsort(self.rng.random((len(newDeck), NUM_CARDS)), axis=1)
+		self.deckCursor[newDeck] = 0
+		self.dealer[newDeck] = (self.dealer[newDeck] + 1) % NUM_SEATS
+		for roundIndex, numberOfCards in enumerate(ROUNDS):
+			dealt = games[self.rounds[games] % len(ROUNDS) == roundIndex]
+			for turn in range(NUM_SEATS):
+				seats = (self.dealer[dealt] + turn) % NUM_SEATS
+				cards = self.deck[dealt[:, None], self.deckCursor[dealt][:, None] + np.arange(numberOfCards)]
+				self.hands[dealt[:, None], seats[:, None], cards] = True
+				self.deckCursor[dealt] += numberOfCards
+		for seat in range(NUM_SEATS // 2):
+			teammate = seat + 2
+			card1 = self._randomCard(games, np.full(len(games), seat))
+			card2 = self._randomCard(games, np.full(len(games), teammate))
+			self.hands[games, seat, card1] = False
+			self.hands[games, teammate, card2] = False
+			self.hands[games, seat, card2] = True
+			self.hands[games, teammate, card1] = True
+		# the dealer plays first
+		self.active[games] = (self.dealer[games] - 1) % NUM_SEATS
+		self.handsFinished[games] = 0
+		self.roundStarted[games] = True
+
+	def _randomCard(self, games : np.ndarray, seats : np.ndarray) -> np.ndarray:
+		scores = np.where(self.hands[games, seats], self.rng.random((len(games), NUM_CARDS)), -1.0)
+		return scores.argmax(axis=1)
+
+	def step(self) -> None:
+		# plays one turn in every game which is not over
+		games = np.nonzero(~self.over)[0]
+		if len(games) == 0:
+			return
+		toDeal = games[~self.roundStarted[games]]
+		if len(toDeal):
+			self._dealRound(toDeal)
+
+		self.active[games] = (self.active[games] + 1) % NUM_SEATS
+		seats = self.active[games]
+		playing = games[self.hands[games, seats].any(axis=1)]
+		if len(playing):
+			self._playTurn(playing)
+		self._endTurn(games)
+
+	def _playTurn(self, games : np.ndarray) -> None:
+		n = len(games)
+		main, switch, seven, sevenOutcomes, slotSpots = self.legalMoves(games)
+		actions = np.concatenate([main.reshape(n, -1), switch.reshape(n, -1), seven[:, None]], axis=1)
+		hasMove = actions.any(axis=1)
+		self.turns[games] += 1
+
+		# no available move: the player must fold
+		folding = games[~hasMove]
+		self.folds[folding] += 1
+		self.hands[folding, self.active[folding]] = False
+
+		# otherwise a legal action is picked at random, among the ones which do not enter a house in front of an empty one
+		# (which could then never be filled) if there are any
+		jamming = np.zeros_like(actions)
+		jamming[:, :NUM_MAIN_ACTIONS] = self._jammingEnters(games, slotSpots).reshape(n, -1)
+		preferred = actions & ~jamming
+		candidates = np.where(preferred.any(axis=1)[:, None], preferred, actions)
+		chosen = np.where(candidates, self.rng.random(actions.shape), -1.0).argmax(axis=1)
+		isMain = hasMove & (chosen < NUM_MAIN_ACTIONS)
+		isSwitch = hasMove & (chosen >= NUM_MAIN_ACTIONS) & (chosen < NUM_MAIN_ACTIONS + NUM_SWITCH_ACTIONS)
+		isSeven = hasMove & (chosen == NUM_MAIN_ACTIONS + NUM_SWITCH_ACTIONS)
+		if isMain.any():
+			value, kind, slot = np.unravel_index(chosen[isMain], (NUM_VALUES, NUM_KINDS, NUM_PIECES))
+			self._applyMain(games[isMain], value, kind, slotSpots[isMain, slot])
+		if isSwitch.any():
+			slot, target = np.unravel_index(chosen[isSwitch] - NUM_MAIN_ACTIONS, (NUM_PIECES, NUM_SPOTS))
+			self._applySwitch(games[isSwitch], slotSpots[isSwitch, slot], target)
+		if isSeven.any():
+			self._applySeven(games, np.nonzero(isSeven)[0], sevenOutcomes)
+
+		finished = games[~self.hands[games, self.active[games]].any(axis=1)]
+		self.handsFinished[finished] += 1
+
+	def _jammingEnters(self, games : np.ndarray, slotSpots : np.ndarray) -> np.ndarray:
+		# (n, values, kinds, slots) mask of the ENTER actions which would leave an empty house after the one entered
+		n = len(games)
+		emptyAfter = ((self.houses[games] < 0)[:, None, :] & HOUSES_AFTER[None, :, :]).any(axis=2)
+		slotHouses = HOUSES[self.owners(games)[:, None], slotSpots]
+		jamming = np.zeros((n, NUM_VALUES, NUM_KINDS, NUM_PIECES), dtype=bool)
+		for slot, enterKind in enumerate([KIND_ENTER1, KIND_ENTER2]):
+			houses = slotHouses[:, :, DISTANCES[:, slot]].transpose(0, 2, 1)
+			jamming[:, :, enterKind, :] = (houses >= 0) & emptyAfter[np.arange(n)[:, None, None], np.maximum(houses, 0)]
+		return jamming
+
+	def _discard(self, games : np.ndarray, values : np.ndarray) -> None:
+		# the card discarded is the first card of the chosen value in the hand
+		seats = self.active[games]
+		suits = self.hands[games, seats].reshape(len(games), NUM_VALUES, len(SUITS))[np.arange(len(games)), values].argmax(axis=1)
+		self.hands[games, seats, values * len(SUITS) + suits] = False
+
+	def _applyMain(self, games, values, kinds, origins) -> None:
+		owners = self.owners(games)
+		self._discard(games, values)
+
+		# OUT: the piece is placed on the exit spot
+		out = kinds == KIND_OUT
+		if out.any():
+			g, o = games[out], owners[out]
+			self.occupant[g, FIRST_SPOTS[o]] = o
+			self.blocking[g, FIRST_SPOTS[o]] = True
+
+		# MOVE and BACK: the piece on the target spot (if any) is kicked
+		moving = (kinds == KIND_MOVE1) | (kinds == KIND_MOVE2) | (kinds == KIND_BACK)
+		if moving.any():
+			g, o, x = games[moving], owners[moving], origins[moving]
+			distance = np.where(kinds[moving] == KIND_BACK, -4, DISTANCES[values[moving], np.where(kinds[moving] == KIND_MOVE2, 1, 0)])
+			target = (x + distance) % NUM_SPOTS
+			kicked = self.occupant[g, target].astype(np.int64)
+			self.occupant[g, x] = -1
+			self.blocking[g, x] = False
+			self.occupant[g, target] = o
+			np.add.at(self.kicks, g[kicked >= 0], 1)
+
+		# ENTER: the house is taken, kicking whatever was there
+		entering = (kinds == KIND_ENTER1) | (kinds == KIND_ENTER2)
+		if entering.any():
+			g, o, x = games[entering], owners[entering], origins[entering]
+			distance = DISTANCES[values[entering], np.where(kinds[entering] == KIND_ENTER2, 1, 0)]
+			house = HOUSES[o, x, distance]
+			self.occupant[g, x] = -1
+			self.blocking[g, x] = False
+			np.add.at(self.kicks, g[self.houses[g, house] >= 0], 1)
+			self.houses[g, house] = o
+
+	def _applySwitch(self, games, origins, targets) -> None:
+		owners = self.owners(games)
+		self._discard(games, np.full(len(games), VALUE_J))
+		self.occupant[games, origins] = self.occupant[games, targets]
+		self.occupant[games, targets] = owners
+
+	def _applySeven(self, games : np.ndarray, indexes : np.ndarray, outcomes : tuple) -> None:
+		# one of the final positions of each game (games[indexes]) is picked at random, preferably one which does not leave
+		# the owner with houses that can no longer be filled
+		outcomeRows, occupant, blocking, houses = outcomes
+		candidates = np.nonzero(np.isin(outcomeRows, indexes))[0]
+		owners = self.owners(games[outcomeRows[candidates]])
+		jamming = jammedColors(houses[candidates])[np.arange(len(candidates)), owners]
+		# the last candidate of each game is taken, the ones which jam sorting first
+		order = np.lexsort((self.rng.random(len(candidates)), ~jamming, outcomeRows[candidates]))
+		candidates = candidates[order]
+		rows = outcomeRows[candidates]
+		chosen = candidates[np.append(rows[1:] != rows[:-1], True)]
+		g = games[outcomeRows[chosen]]
+		self._discard(g, np.full(len(g), VALUE_7))
+		before = (self.occupant[g] >= 0).sum(axis=1) + (self.houses[g] >= 0).sum(axis=1)
+		self.kicks[g] += before - (occupant[chosen] >= 0).sum(axis=1) - (houses[chosen] >= 0).sum(axis=1)
+		self.occupant[g] = occupant[chosen]
+		self.blocking[g] = blocking[chosen]
+		self.houses[g] = houses[chosen]
+
+	def _endTurn(self, games : np.ndarray) -> None:
+		seats = self.active[games]
+		teammates = teammateOf(seats)
+		filled = (self.houses[games] >= 0).reshape(len(games), NUM_SEATS, SPOTS_PER_HOUSE).all(axis=2)
+		rows = np.arange(len(games))
+		seatFilled = filled[rows, seats]
+		win = seatFilled & filled[rows, teammates]
+		self.finished[games[win]] = True
+		self.winner[games[win]] = seats[win] % NUMBER_OF_TEAMS
+		takeOver = ~win & seatFilled & ~self.takenOver[games, seats]
+		self.takenOver[games[takeOver], seats[takeOver]] = True
+
+		# a game no team can win any more is stalled
+		jammed = jammedColors(self.houses[games])
+		canWin = np.stack([~jammed[:, team] & ~jammed[:, team + 2] for team in range(NUMBER_OF_TEAMS)], axis=1).any(axis=1)
+		self.stalled[games[~win & ~canWin]] = True
+
+		# a round is over when every hand is empty
+		roundOver = (self.handsFinished[games] >= NUM_SEATS) & ~self.finished[games]
+		self.rounds[games[roundOver]] += 1
+		self.roundStarted[games[roundOver]] = False
+
+	def run(self) -> None:
+		while not self.over.all():
+			self.step()
+
+	# --- checking against the engine ---
+
+	def loadTable(self, game : int, state : engine.TableState) -> None:
+		# puts game in the position of a table of the engine (whose board has the colors in seat order)
+		boardState = state.board.state
+		seatOf = lambda ownerIndex: -1 if ownerIndex == EMPTY else boardState.ownerColorIndex(ownerIndex)
+		self.occupant[game] = [seatOf(ownerIndex) for ownerIndex in boardState.spotOwner]
+		self.blocking[game] = [blocking != 0 for blocking in boardState.spotBlocking]
+		self.houses[game] = [seatOf(ownerIndex) for ownerIndex in boardState.houseOwner]
+		self.hands[game] = False
+		for player in state.players:
+			seat = boardState.colorIndex(player.color)
+			self.takenOver[game, seat] = player.name in state.takenOver
+			for card in player.hand.cards or []:
+				self.hands[game, seat, card.index] = True
+		self.active[game] = boardState.colorIndex(state.activePlayer.color)
+
+
+def randomTable(rng : random.Random) -> engine.TableState:
+	# A table in a random position, the active player (who may have taken over) holding 1 to 5 cards and the others none.
+	players = [Player(f'bot{seat}', f'bot{seat}', str(seat % NUMBER_OF_TEAMS), COLORS[seat]) for seat in range(NUM_SEATS)]
+	state = engine.newTable(COLORS, players, Deck(rng.randrange(1 << 32)))
+	state.activePlayerIndex = rng.randrange(NUM_SEATS)
+	active = state.activePlayer
+	freeSpots = list(range(NUM_SPOTS))
+	rng.shuffle(freeSpots)
+	for player in players:
+		houses = state.board.getHousesByColor(player.color)
+		filled = SPOTS_PER_HOUSE if player is active and rng.random() < 0.25 else rng.randint(0, SPOTS_PER_HOUSE)
+		for house in rng.sample(houses, filled):
+			house.setOccupant(player)
+		if filled == SPOTS_PER_HOUSE and player is active:
+			state.takenOver.add(player.name)
+		firstSpot = state.board.getFirstSpot(player.color)
+		for _ in range(rng.randint(0, SPOTS_PER_HOUSE - filled)):
+			index = freeSpots.pop()
+			spot = state.board.getSpot(COLORS[index // SPOTS_PER_REGION], index % SPOTS_PER_REGION)
+			spot.setOccupant(player, spot == firstSpot and rng.random() < 0.5)
+		player.assignHand(BitHand(player))
+	active.assignHand(BitHand(active, rng.sample(CARDS, rng.randint(1, 5))))
+	return state
+
+
+def _boardKey(occupant, blocking, houses) -> tuple:
+	return tuple(int(x) for x in occupant), tuple(bool(x) for x in blocking), tuple(int(x) for x in houses)
+
+
+def _engineActions(state : engine.TableState, moves : list[Move]) -> set:
+	# the moves of the engine as actions of BatchGames.legalMoves: ('main', value, kind, origin spot), ('switch', origin
+	# spot, target spot) or ('seven',)
+	actions = set()
+	for move in moves:
+		if move.ID == 'SEVEN':
+			actions.add(('seven',))
+			continue
+		if move.ID == 'SWITCH':
+			actions.add(('switch', move.originSpot.index, move.targetSpot.index))
+			continue
+		value = VALUE_INDEX[move.card.value]
+		if move.ID == 'OUT':
+			kind = KIND_OUT
+		elif move.ID == 'BACK':
+			kind = KIND_BACK
+		elif move.ID == 'MOVE':
+			kind = KIND_MOVE1 if (move.targetSpot.index - move.originSpot.index) % NUM_SPOTS == DISTANCES[value, 0] else KIND_MOVE2
+		else:
+			color = state.board.state.colorIndex(move.player.color)
+			kind = KIND_ENTER1 if HOUSES[color, move.originSpot.index, DISTANCES[value, 0]] == move.targetSpot.index else KIND_ENTER2
+		actions.add(('main', value, kind, move.originSpot.index))
+	return actions
+
+
+def _engineSevenOutcomes(state : engine.TableState, move : Move) -> set:
+	# the boards every seven split leads to, played as engine.playMove does
+	boardState = state.board.state
+	seatOf = lambda ownerIndex: -1 if ownerIndex == EMPTY else boardState.ownerColorIndex(ownerIndex)
+	outcomes = set()
+	for sevenSplit in engine.sevenSplits(state, move):
+		token = boardState.mark()
+		for step in sevenSplit.moves:
+			step.originSpot.setEmpty()
+			step.targetSpot.setOccupant(move.player)
+		outcomes.add(_boardKey([seatOf(o) for o in boardState.spotOwner], boardState.spotBlocking, [seatOf(o) for o in boardState.houseOwner]))
+		boardState.undo(token)
+	return outcomes
+
+
+def checkParity(positions : int, seed : int = 0) -> int:
+	# Compares the legal moves (and the outcomes of the seven splits) of BatchGames with the ones of the engine on random
+	# positions, and returns the number of positions where they differ.
+	rng = random.Random(seed)
+	games = BatchGames(positions, seed)
+	expected = []
+	# the board prints its creation
+	with contextlib.redirect_stdout(io.StringIO()):
+		for game in range(positions):
+			state = randomTable(rng)
+			moves = engine.legalMoves(state)
+			sevens = [move for move in moves if move.ID == 'SEVEN']
+			expected.append((_engineActions(state, moves), _engineSevenOutcomes(state, sevens[0]) if sevens else set()))
+			games.loadTable(game, state)
+
+	main, switch, seven, (outcomeRows, occupant, blocking, houses), slotSpots = games.legalMoves(np.arange(positions))
+	owners = games.owners(np.arange(positions))
+	mismatches = 0
+	for game, (engineActions, engineOutcomes) in enumerate(expected):
+		actions = set()
+		for value, kind, slot in zip(*np.nonzero(main[game])):
+			actions.add(('main', int(value), int(kind), int(FIRST_SPOTS[owners[game]] if kind == KIND_OUT else slotSpots[game, slot])))
+		for slot, target in zip(*np.nonzero(switch[game])):
+			actions.add(('switch', int(slotSpots[game, slot]), int(target)))
+		if seven[game]:
+			actions.add(('seven',))
+		outcomes = {_boardKey(occupant[row], blocking[row], houses[row]) for row in np.nonzero(outcomeRows == game)[0]}
+		if actions != engineActions or outcomes != engineOutcomes:
+			mismatches += 1
+			print(f'[Parity] position {game}: {len(actions ^ engineActions)} actions and {len(outcomes ^ engineOutcomes)} seven outcomes differ from the engine', file=sys.stderr)
+	return mismatches
+
+
+def main(argv : list[str] = None) -> None:
+	parser = argparse.ArgumentParser(prog='toc-batchsim', description='Play random games in lockstep with NumPy and print a summary.')
+	parser.add_argument('--games', type=int, default=1000, help='number of games played at once')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--max-rounds', type=int, default=SIMULATION_MAX_ROUNDS, help='rounds after which a game not won yet is stopped')
+	parser.add_argument('--check-parity', type=int, default=0, metavar='POSITIONS', help='compare the legal moves with the ones of the engine on that many random positions instead of playing')
+	args = parser.parse_args(argv)
+
+	if args.check_parity:
+		mismatches = checkParity(args.check_parity, args.seed)
+		print(json.dumps({"positions": args.check_parity, "mismatches": mismatches}))
+		sys.exit(1 if mismatches else 0)
+
+	startTime = time.perf_counter()
+	games = BatchGames(args.games, args.seed, args.max_rounds)
+	games.run()
+	wallTime = time.perf_counter() - startTime
+	print(json.dumps({"games": args.games, "rounds": int(games.rounds.sum()), "turns": int(games.turns.sum()), "folds": int(games.folds.sum()), "kicks": int(games.kicks.sum()), "wins": [int((games.winner == team).sum()) for team in range(NUMBER_OF_TEAMS)], "stalled": int(games.stalled.sum()), "capped": int(games.capped.sum()), "wall_time": wallTime}))
+
+
+if __name__ == '__main__':
+	main()
@@ -1,8 +1,12 @@
 from __future__ import annotations
-from typing import Optional
-import copy
+from typing import Optional, Iterator
+from itertools import islice
+from collections import OrderedDict
 
+from boardstate import BoardState, EMPTY
+from geometry import getGeometry, CARD_DISTANCES, MIN_DISTANCE
 from move import Move
+from seven import SevenSplitEnumerator
 from spot import Spot, House
 
 from params import *
@@ -11,19 +15,27 @@ from params import *
 class Board:
 	def __init__(self, colors : List):
 		self._savedState = None
-		self._spots = []
 		self._colors = colors
+		# The occupancy of every spot and house is held by the compact state, the Spot and House objects below are views over it.
+		self._state = BoardState(colors)
+		self._geometry = getGeometry(colors)
+		self._moveCache = OrderedDict()
+		self._spots = []
 		for color in colors:
 			for i in range(SPOTS_PER_REGION):
-				self._spots.append(Spot(color, i))
+				self._spots.append(Spot(color, i, self._state, len(self._spots)))
 
 		self._houses = []
 		for color in colors:
 			for i in range(SPOTS_PER_HOUSE):
-				self._houses.append(House(color, i))
+				self._houses.append(House(color, i, self._state, len(self._houses)))
 
 		print(f'Created the board with the following ordered colors: {colors}')
 
+	@property
+	def state(self) -> BoardState:
+		return self._state
+
 	def __str__(self) -> str:
 		s = ''
 		for spot in self._spots:
@@ -38,11 +50,14 @@ class Board:
 		return s
 
 	def getHousesByColor(self, color : str) -> list[House]:
-		colorIndex = self._colors.index(color)
+		colorIndex = self._state.colorIndex(color)
 		return self._houses[colorIndex * SPOTS_PER_HOUSE: (colorIndex + 1) * SPOTS_PER_HOUSE]
 
 	def areAllHouseFilled(self, color : str) -> bool:
-		return all([house.isOccupied for house in self.getHousesByColor(color)])
+		return self._state.filledHouses(self._state.colorIndex(color)) == SPOTS_PER_HOUSE
+
+	def getNumberOfPiecesOnTheBoard(self, color : str) -> int:
+		return self._state.piecesOfColor(self._state.colorIndex(color))
 
 	def getPreviousColor(self, color : str) -> str:
 		colorIndex = self._colors.index(color)
@@ -52,55 +67,69 @@ class Board:
 			return self._colors[colorIndex - 1]
 
 	def saveState(self) -> None:
-		# This method used by the Player.getSevenMoveFromPlayer() to store the state of the board while the player is doing the "seven split".
-		# This way, the seven split can be done while giving the player a view of what is done step by step, while giving the player the option
-		# to cancel and choose another card to play, or to play the seven split a different way.
-		self._savedState = {'Spots': copy.deepcopy(self._spots), 'Houses': copy.deepcopy(self._houses)}
+		# This method used to store the state of the board before previewing moves, so that it can be restored afterwards.
+		# Only the changes done in between are recorded (see applyMove() and undo()), nothing is copied.
+		self._savedState = self._state.mark()
 
 	def restoreState(self) -> None:
 		# See method above.
-		##debug##print(f'Call to restoreState with self.saveState Spots = {[str(spot) + ' - Occupied ? ' + str(spot.isOccupied) + ' by ' + str(spot.occupant.name) for spot in self._savedState['Spots']]} and self.saveState Houses = {[str(house) + ' - Occupied ? ' + str(house.isOccupied) + ' by ' + str(house.occupant.name) for house in self._savedState['Houses']]}')
-		self._spots = self._savedState['Spots']
-		self._houses = self._savedState['Houses']
+		self._state.undo(self._savedState)
+
+	def applyMove(self, move : Move) -> int:
+		# Applies the effect of a move on the spots and houses only (the counters of the players are left untouched), and returns
+		# a token to be given to undo() to revert it (along with anything applied after it), or to commit() to keep it.
+		token = self._state.mark()
+		if move.ID == 'OUT':
+			move.targetSpot.setOccupant(move.player, True)
+		elif move.ID in ['MOVE', 'BACK', 'ENTER']:
+			move.originSpot.setEmpty()
+			move.targetSpot.setOccupant(move.player)
+		elif move.ID == 'SWITCH':
+			move.originSpot.setOccupant(move.targetSpot.occupant)
+			move.targetSpot.setOccupant(move.player)
+		return token
+
+	def undo(self, token : int) -> None:
+		self._state.undo(token)
+
+	def commit(self, token : int) -> None:
+		self._state.commit(token)
 
 	def getSpot(self, color : str, number : int) -> Spot:
-		return self._spots[self._colors.index(color)*SPOTS_PER_REGION + number]
+		return self._spots[self._state.colorIndex(color)*SPOTS_PER_REGION + number]
 
-	def getSpotById(self, spotId : str) -> Spot:
-		res = [spot for spot in self._spots if str(spot) == spotId]
-		spot = res[0]
-		print(f'[getSpotById] called with spotId = {spotId}, result is {id(spot)} (len(res) was {len(res)})')
-		return spot
+	def getSpotById(self, spotId : str) -> Optional[Spot]:
+		index = self._state.spotIndex(spotId)
+		if index is None:
+			return None
+		return self._spots[index]
 
 	def getHouse(self, color : str, number : int) -> Spot:
-		return self._houses[self._colors.index(color)*SPOTS_PER_HOUSE + number]
+		return self._houses[self._state.colorIndex(color)*SPOTS_PER_HOUSE + number]
 
-	def getHouseById(self, houseId : str) -> Spot:
-		house = [house for house in self._houses if str(house) == houseId][0]
-		return house
+	def getHouseById(self, houseId : str) -> Optional[Spot]:
+		index = self._state.houseIndex(houseId)
+		if index is None:
+			return None
+		return self._houses[index]
 
 	def getFirstSpot(self, color : str) -> Optional[Spot]:
-		for spot in self._spots:
-			if spot.color == color and spot.number == 0:
-				return spot
-		return None  # in case no such spot is found, but there should always be one
+		return self._spots[self._state.colorIndex(color)*SPOTS_PER_REGION]
 
 	def getOccupiedSpotsOnTheBoard(self, player) -> list[Spot]:
-		result = []
-		##debug##print(f'Call to getOccupiedSpotsOnTheBoard with requested with current self._spots = {[str(spot) + ' - Occupied ? ' + str(spot.isOccupied) + ' by ' + str(spot.occupant) for spot in self._spots]}')
-		for spot in self._spots:
-			if not spot.occupant is None:
-				if spot.occupant.name == player:
-					result.append(spot)
-		##debug##print(f'returning : {result}')
-		return result
+		ownerIndex = self._state.ownerIndexByName(player)
+		if ownerIndex == EMPTY:
+			return []
+		return [self._spots[index] for index in sorted(self._state.spotsOfColor(self._state.ownerColorIndex(ownerIndex)))]
 
 	def getOtherPiecesOnTheBoard(self, player) -> list[Spot]:
-		result = []
-		for spot in self._spots:
-			if spot.occupant != player and spot.isOccupied:
-				result.append(spot)
-		return result
+		ownerIndex = self._state.ownerIndexByName(player.name)
+		colorIndex = self._state.ownerColorIndex(ownerIndex) if ownerIndex != EMPTY else EMPTY
+		indexes = []
+		for otherColorIndex in range(len(self._colors)):
+			if otherColorIndex != colorIndex:
+				indexes.extend(self._state.spotsOfColor(otherColorIndex))
+		return [self._spots[index] for index in sorted(indexes)]
 
 	def getAllPiecesOfOtherPlayer(self, player) -> list[Spot]:
 		return getOtherPiecesOnTheBoard(player)
@@ -108,35 +137,27 @@ class Board:
 	def getAllPiecesOnTheBoard(self) -> list[Spot]:
 		return [{"spotIndex": str(house), "playerId": house.occupant.name} for house in self._houses if house.isOccupied] + [{"spotIndex": str(spot), "playerId": spot.occupant.name} for spot in self._spots if spot.isOccupied]
 
+	def getSnapshot(self) -> dict:
+		# occupied spots as [index, name of the occupant, blocking] and occupied houses as [index, name of the occupant]
+		state = self._state
+		return {"spots": [[index, state.owner(owner).name, state.spotBlocking[index]] for index, owner in enumerate(state.spotOwner) if owner != EMPTY], "houses": [[index, state.owner(owner).name] for index, owner in enumerate(state.houseOwner) if owner != EMPTY]}
+
+	def loadSnapshot(self, snapshot : dict, playersByName : dict) -> None:
+		# the board is expected to be empty
+		for index, name, blocking in snapshot['spots']:
+			self._state.setSpot(index, self._state.ownerIndex(playersByName[name]), blocking)
+		for index, name in snapshot['houses']:
+			self._state.setHouse(index, self._state.ownerIndex(playersByName[name]))
+
 	def getSpotFromDistance(self, originSpot : Spot, distance : int) -> Spot:
-		targetIndex = self._spots.index(originSpot) + distance
-		if targetIndex >= SPOTS_PER_REGION * len(COLORS):
-			targetIndex -= SPOTS_PER_REGION * len(COLORS)
-		if targetIndex < 0:
-			targetIndex += SPOTS_PER_REGION * len(COLORS)
-		return self._spots[targetIndex]
+		return self._spots[self._geometry.target(originSpot.index, distance)]
 
 	def getHouseFromDistance(self, originSpot : Spot, distance : int, player : Player) -> Optional[House]:
-		##debug##print(f'Call to getHouseFromDistance with originSpot = {originSpot}, distance = {distance}, player = {player.name}')
-		
-		if originSpot.color != self.getPreviousColor(player.color) or (originSpot.color == player.color and originSpot.number != 0 and originSpot.isBlocking):
-			# houses are only reachable from spots just before the player's own color, or from the player own color-0 spot (unless it just exited and thus is blocking).
-			##debug##print('Returning empty array because current spot cannot reach any house')
+		# houses are only reachable from spots just before the player's own color, see BoardGeometry
+		house = self._geometry.house(self._state.colorIndex(player.color), originSpot.index, distance)
+		if house is None:
 			return None
-
-		targetIndex = self._spots.index(originSpot) + distance
-		##debug##print(f'targetIndex = {targetIndex}')
-		if targetIndex >= SPOTS_PER_REGION * len(COLORS):
-			targetIndex -= SPOTS_PER_REGION * len(COLORS)
-			##debug##print(f'targetIndex is >= than SPOTS_PER_REGION * len(COLORS) = {SPOTS_PER_REGION * len(COLORS)}, so correcting its value to {targetIndex}')
-
-		playerColorIndex = self._colors.index(player.color)
-		firstHouseIndex = (playerColorIndex * SPOTS_PER_REGION)
-		##debug##print(f'firstHouseIndex = {firstHouseIndex}')
-		if targetIndex in range(firstHouseIndex, firstHouseIndex + SPOTS_PER_HOUSE):
-			##debug##print(f'targetIndex is in the house range so returning {self._houses[(playerColorIndex * SPOTS_PER_HOUSE) + targetIndex - firstHouseIndex  - 1]}')
-			return self._houses[(playerColorIndex * SPOTS_PER_HOUSE) + targetIndex - firstHouseIndex - 1]
-		return None
+		return self._houses[house]
 
 	def isMoveValid(self, move : Move) -> bool:
 		##debug##print(f'call isMoveValid with move = {move.ID}, originSpot = {move.originSpot}, targetSpot = {move.targetSpot}')
@@ -153,174 +174,126 @@ class Board:
 				result = False
 		elif move.ID == 'MOVE':
 			# Cannot do a MOVE move up X spots if there is a blocking spot less or equal to X spots ahead
-			i = 0
-			spotAhead = self.getSpotFromDistance(move.originSpot, i + 1)
-			while spotAhead != move.targetSpot:
-				if spotAhead.isBlocking:
-					result = False
-				i += 1
-				spotAhead = self.getSpotFromDistance(move.originSpot, i + 1)
-			if move.targetSpot.isBlocking:
+			distance = (move.targetSpot.index - move.originSpot.index) % self._state.numSpots or self._state.numSpots
+			if self._state.blockingMask & self._geometry.pathMask(move.originSpot.index, distance):
 				result = False
 		elif move.ID == 'BACK':
 			# Cannot do a BACK move back 4 spots if there is a blocking spot less or equal to 4 spots behind
-			i = 0
-			spotBack = self.getSpotFromDistance(move.originSpot, i - 1)
-			while spotBack != move.targetSpot:
-				if spotBack.isBlocking:
-					result = False
-				i -= 1
-				spotBack = self.getSpotFromDistance(move.originSpot, i - 1)
-			if move.targetSpot.isBlocking:
+			distance = (move.originSpot.index - move.targetSpot.index) % self._state.numSpots or self._state.numSpots
+			if self._state.blockingMask & self._geometry.pathMask(move.originSpot.index, -distance):
 				result = False
 		elif move.ID == 'ENTER':
 			# Cannot do a ENTER move X spots if there is a house spot already taken before...
 			# also if the player is coming from a spot before the exit point then it's OK to enter at any of the 4 houses as long as the previous houses (before the targetted house) are not already occupied
 			# if the player is coming from another house before the target house, it's actually the same logic, the houses in between the origin house and the targethouse cannot be occupied
-			houseColor = move.targetSpot.color
-			##debug##print(f'isinstance(move.originSpot, Spot) = {isinstance(move.originSpot, Spot)} and self.getFirstSpot(houseColor).isBlocking {self.getFirstSpot(houseColor).isBlocking}')
-			if isinstance(move.originSpot, Spot) and self.getFirstSpot(houseColor).isBlocking:
+			houseIndex = move.targetSpot.index
+			if self._state.blockingMask >> self._geometry.firstSpotIndexOfHouse(houseIndex) & 1:
+				result = False
+			elif self._state.houseMask & self._geometry.housesBeforeMask(houseIndex):
 				result = False
-			else:
-				housesBeforeTarget = []
-				for house in self.getHousesByColor(houseColor):
-					if house.number < move.targetSpot.number:
-						housesBeforeTarget.append(house) 
-				##debug##print(housesBeforeTarget)
-				if any(house.isOccupied for house in housesBeforeTarget):
-					##debug##print('a house is blocking the way!')
-					##debug##print([house.isOccupied for house in housesBeforeTarget])
-					result = False
 		elif move.ID == 'SEVEN':
 			# Cannot do a SEVEN move if there is not at least one piece on the board
-			# and even then it might not be possible !! ##TODO##
-			if move.player.piecesOnTheBoard == 0:
+			# and even then it is only possible if the 7 steps can all be played
+			if move.player.piecesOnTheBoard == 0 or not SevenSplitEnumerator(self, move.player).isFeasible():
 				result = False
 		##debug##		print(f'returning {result}')
 		return result
 
 	def getMoveOptions(self, player : Player, card : Card) -> Optional[list[Move]]:
-		options = []
-		
-		# player wants to play an A : player can either get a piece out, or move a piece 11 or 1
-		if card.value == 'A':
-			potentialMove = Move('OUT', self.getFirstSpot(player.color), self.getFirstSpot(player.color), card, player)
-			if self.isMoveValid(potentialMove):
-				options.append(potentialMove)
-
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			if len(occupiedSpotsOnTheBoard) > 0:
-				# player has at least a piece on the board, may be able to move them
-				for piece in occupiedSpotsOnTheBoard:
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, 1), card, player)
-					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, 11), card, player)
-					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-
-					availableHouse = self.getHouseFromDistance(piece, 1, player)
-					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
-						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
-					availableHouse = self.getHouseFromDistance(piece, 11, player)
-					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
-						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
-
-		# player wants to play a K : player can either get a piece out, or move a piece 13
-		elif card.value == 'K':
-			potentialMove = Move('OUT', self.getFirstSpot(player.color), self.getFirstSpot(player.color), card, player)
-			if self.isMoveValid(potentialMove):
-				options.append(potentialMove)
-
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			if len(occupiedSpotsOnTheBoard) > 0:
-				# player has at least a piece on the board, may be able to move them
-				for piece in occupiedSpotsOnTheBoard:
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, 13), card, player)
-					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-
-					availableHouse = self.getHouseFromDistance(piece, 13, player)
-					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
-						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
-
+		return self.getMoveOptionsForHand(player, [card])
+
+	def getMoveOptionsForHand(self, player : Player, cards : list[Card]) -> list[Move]:
+		return list(self.iterMoveOptionsForHand(player, cards))
+
+	def iterMoveOptionsForHand(self, player : Player, cards : list[Card]) -> Iterator[Move]:
+		# Used by Hand.getAllPossibleMoves() : the pieces of the player (and of the other players) are only looked up once for the
+		# whole hand, and the moves are only generated once per distinct card value, then attached to each card of that value.
+		# The moves found for a given position (see BoardState.hash), player and card value are also kept in a LRU cache, since
+		# the same positions are evaluated over and over (seven splits, bots, hints...).
+		# The moves are generated as they are consumed, so the board must not change until the iteration is over. The moves of a
+		# card value only go to the cache once they have all been generated.
+		occupiedSpotsOnTheBoard = None
+		otherPiecesOnTheBoard = None
+		optionsByValue = {}
+		for card in cards:
+			moves = optionsByValue.get(card.value)
+			if moves is None:
+				cacheKey = (self._state.hash, player.name, player.color, card.value)
+				moves = self._moveCache.get(cacheKey)
+				if moves is None:
+					if occupiedSpotsOnTheBoard is None:
+						occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
+					if card.value == 'J' and otherPiecesOnTheBoard is None:
+						otherPiecesOnTheBoard = self.getOtherPiecesOnTheBoard(player)
+					moves = []
+					for move in self._iterMoveOptions(player, card, occupiedSpotsOnTheBoard, otherPiecesOnTheBoard):
+						moves.append(move)
+						yield move
+					self._moveCache[cacheKey] = moves
+					if len(self._moveCache) > MOVE_CACHE_SIZE:
+						self._moveCache.popitem(last = False)
+					optionsByValue[card.value] = moves
+					continue
+				self._moveCache.move_to_end(cacheKey)
+				optionsByValue[card.value] = moves
+			for move in moves:
+				yield move if move.card is card else Move(move.ID, move.originSpot, move.targetSpot, card, player)
+
+	def getFirstMoveOptions(self, player : Player, cards : list[Card], limit : int) -> list[Move]:
+		# At most limit moves of the hand, the generation stopping as soon as they are found: enough to know whether a player
+		# has to fold (limit = 1) or has a single move to play (limit = 2). The 7 is looked at last, since checking that its 7
+		# steps can be played is by far the most expensive.
+		cards = sorted(cards, key = lambda card: card.value == '7')
+		return list(islice(self.iterMoveOptionsForHand(player, cards), limit))
+
+	def hasAnyMoveOption(self, player : Player, cards : list[Card]) -> bool:
+		return len(self.getFirstMoveOptions(player, cards, 1)) > 0
+
+	def _iterMoveOptions(self, player : Player, card : Card, occupiedSpotsOnTheBoard : list[Spot], otherPiecesOnTheBoard : list[Spot] = None) -> Iterator[Move]:
 		# player wants to play a J : player can only switch two pieces together
-		elif card.value == 'J':
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			otherPiecesOnTheBoard = self.getOtherPiecesOnTheBoard(player)
+		if card.value == 'J':
+			if otherPiecesOnTheBoard is None:
+				otherPiecesOnTheBoard = self.getOtherPiecesOnTheBoard(player)
 			if len(occupiedSpotsOnTheBoard) > 0 and len(otherPiecesOnTheBoard) > 0:
 				# player has at least a piece on the board, and there is at least one other piece on the board belonging to another player
 				for piece in occupiedSpotsOnTheBoard:
 					for other_piece in otherPiecesOnTheBoard:
 						potentialMove = Move('SWITCH', piece, other_piece, card, player)
 						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
-
-		# player wants to play a 4 : player can either move 4 or -4
-		elif card.value == '4':
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			if len(occupiedSpotsOnTheBoard) > 0:
-				# player has at least a piece on the board, may be able to move them
-				for piece in occupiedSpotsOnTheBoard:
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, 4), card, player)
-					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-					potentialMove = Move('BACK', piece, self.getSpotFromDistance(piece, -4), card, player)
-					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-
-					availableHouse = self.getHouseFromDistance(piece, 4, player)
-					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
-						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
+							yield potentialMove
 
 		# player wants to play a 7 : player can move exactly 7 times split among all the pieces he/she has one the board
 		elif card.value == '7':
 			potentialMove = Move('SEVEN', None, None, card, player)
 			if self.isMoveValid(potentialMove):
-				options.append(potentialMove)
-
-		#special card which cannot be played by a player but is used by the Player.getSevenMoveFromPlayer() method to get options for "one-step" moves during a seven split.
-		elif card.value == '1':
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			##debug##print(f'in call getMoveOptions, when asking move for a 1 (in seven-split) : occupiedSpotsOnTheBoard = {occupiedSpotsOnTheBoard}')
-			if len(occupiedSpotsOnTheBoard) > 0:
-				# player has at least a piece on the board, may be able to move them
-				for piece in occupiedSpotsOnTheBoard:
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, 1), card, player)
-					if self.isMoveValid(potentialMove):
-						##debug##print('found a valid MOVE move, appending...')
-						options.append(potentialMove)
-					availableHouse = self.getHouseFromDistance(piece, 1, player)
-					##debug##print(f'found the following availableHouses : {availableHouse}')
-					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
-						##debug##print(f'evaluation the potentialMove : {potentialMove}')
-						if self.isMoveValid(potentialMove):
-							##debug##print('found a valid ENTER move, appending...')
-							options.append(potentialMove)
+				yield potentialMove
 
-		# player is playing any other card, only possible move is to go forward
+		# player is playing any other card : the geometry tables give, for each piece, the spots reached by moving forward
+		# (or backward for a 4) and the house reached if any. An A or a K can also be used to take a piece out.
+		# The special '1' card cannot be played by a player but is used by the Player.getSevenMoveFromPlayer() method to get options for "one-step" moves during a seven split.
 		else:
-			occupiedSpotsOnTheBoard = self.getOccupiedSpotsOnTheBoard(player.name)
-			if len(occupiedSpotsOnTheBoard) > 0:
-				# player has at least a piece on the board, may be able to move them
-				for piece in occupiedSpotsOnTheBoard:
-					potentialMove = Move('MOVE', piece, self.getSpotFromDistance(piece, card.numValue), card, player)
+			forward, backward, canTakeOut = CARD_DISTANCES.get(card.value) or ((card.numValue,), (), False)
+			if canTakeOut:
+				firstSpot = self.getFirstSpot(player.color)
+				potentialMove = Move('OUT', firstSpot, firstSpot, card, player)
+				if self.isMoveValid(potentialMove):
+					yield potentialMove
+
+			colorIndex = self._state.colorIndex(player.color)
+			for piece in occupiedSpotsOnTheBoard:
+				targets = self._geometry.targetsFrom(piece.index)
+				houses = self._geometry.housesFrom(colorIndex, piece.index)
+				for distance in forward:
+					potentialMove = Move('MOVE', piece, self._spots[targets[distance - MIN_DISTANCE]], card, player)
 					if self.isMoveValid(potentialMove):
-						options.append(potentialMove)
-
-					availableHouse = self.getHouseFromDistance(piece, card.numValue, player)
+						yield potentialMove
+				for distance in backward:
+					potentialMove = Move('BACK', piece, self._spots[targets[distance - MIN_DISTANCE]], card, player)
+					if self.isMoveValid(potentialMove):
+						yield potentialMove
+				for distance in forward:
+					availableHouse = houses[distance - MIN_DISTANCE]
 					if not availableHouse is None:
-						potentialMove = Move('ENTER', piece, availableHouse, card, player)
+						potentialMove = Move('ENTER', piece, self._houses[availableHouse], card, player)
 						if self.isMoveValid(potentialMove):
-							options.append(potentialMove)
-
-		return options
\ No newline at end of file
+							yield potentialMove
@@ -0,0 +1,242 @@
+from __future__ import annotations
+from typing import Optional
+import random
+
+from params import *
+
+EMPTY = -1
+
+ZOBRIST_SEED = 0x70C
+_zobristTables = {}
+
+
+def getZobristTables(numColors : int) -> Tuple[list, list, list]:
+	# Random 64 bits keys for (owner color, spot), (spot is blocking) and (owner color, house). They are generated from a fixed
+	# seed so that two boards with the same number of colors hash the same positions the same way.
+	tables = _zobristTables.get(numColors)
+	if tables is None:
+		rng = random.Random(ZOBRIST_SEED + numColors)
+		spotKeys = [[rng.getrandbits(64) for _ in range(SPOTS_PER_REGION * numColors)] for _ in range(numColors)]
+		blockingKeys = [rng.getrandbits(64) for _ in range(SPOTS_PER_REGION * numColors)]
+		houseKeys = [[rng.getrandbits(64) for _ in range(SPOTS_PER_HOUSE * numColors)] for _ in range(numColors)]
+		tables = (spotKeys, blockingKeys, houseKeys)
+		_zobristTables[numColors] = tables
+	return tables
+
+
+def spotId(color : str, number : int) -> str:
+	return 'spot-'+color+'-'+str(number)
+
+
+def houseId(color : str, number : int) -> str:
+	return 'house-'+color+'-'+str(number)
+
+
+class BoardState:
+	# Compact representation of the board: who occupies each spot and house, and which spots are blocking, are kept in flat
+	# integer arrays indexed by spot (or house) index. Owners are stored as small integers, the Player objects themselves only
+	# live in the self._owners list. The Spot and House objects of the Board are thin views over these arrays.
+	def __init__(self, colors : list[str]):
+		self._colors = colors
+		self._colorIndex = {color: index for index, color in enumerate(colors)}
+		self._numSpots = SPOTS_PER_REGION * len(colors)
+		self._numHouses = SPOTS_PER_HOUSE * len(colors)
+
+		self.spotOwner = [EMPTY] * self._numSpots
+		self.spotBlocking = [0] * self._numSpots
+		self.houseOwner = [EMPTY] * self._numHouses
+		# Bit i of blockingMask is set when spot i is blocking, bit i of houseMask when house i is occupied. Both are kept up to
+		# date by setSpot() and setHouse() so that path checks are a single mask test.
+		self.blockingMask = 0
+		self.houseMask = 0
+
+		# Undo log: while at least one mark is outstanding, every change of a spot or a house is recorded as
+		# (isHouse, index, previousOwner, previousBlocking) so that it can be reverted by undo().
+		self._journal = []
+		# outstanding marks, as (token, position in the log when the mark was taken)
+		self._marks = []
+		self._lastMark = 0
+
+		self._owners = []
+		self._ownerIndexByName = {}
+		# Color index of each owner, which is what the position hash is based on (rather than the order in which players were registered)
+		self._ownerColor = []
+
+		# Pieces of each color: the spots they occupy, and how many are in a house. Along with the number of occupied houses of
+		# each color, they are kept up to date by every change of a spot or a house (undo included), and are what the pieces
+		# queries and counts of the Board and the Players are based on.
+		self._spotsOfColor = [set() for _ in colors]
+		self._housePiecesOfColor = [0] * len(colors)
+		self._filledHousesOfColor = [0] * len(colors)
+
+		# Zobrist hash of the position (spot occupancy, blocking flags and house occupancy), updated along with the arrays
+		self._spotKeys, self._blockingKeys, self._houseKeys = getZobristTables(len(colors))
+		self.hash = 0
+
+		self._spotIndexById = {}
+		self._houseIndexById = {}
+		for colorIndex, color in enumerate(colors):
+			for number in range(SPOTS_PER_REGION):
+				self._spotIndexById[spotId(color, number)] = colorIndex * SPOTS_PER_REGION + number
+			for number in range(SPOTS_PER_HOUSE):
+				self._houseIndexById[houseId(color, number)] = colorIndex * SPOTS_PER_HOUSE + number
+
+	@property
+	def colors(self) -> list[str]:
+		return self._colors
+
+	@property
+	def numSpots(self) -> int:
+		return self._numSpots
+
+	@property
+	def numHouses(self) -> int:
+		return self._numHouses
+
+	def colorIndex(self, color : str) -> int:
+		return self._colorIndex[color]
+
+	def spotIndex(self, spotId : str) -> Optional[int]:
+		return self._spotIndexById.get(spotId)
+
+	def houseIndex(self, houseId : str) -> Optional[int]:
+		return self._houseIndexById.get(houseId)
+
+	def ownerIndex(self, player : Player) -> int:
+		# Players are registered the first time they occupy a spot. They are keyed by name, which is unique within a game.
+		if player is None:
+			return EMPTY
+		index = self._ownerIndexByName.get(player.name)
+		if index is None:
+			index = len(self._owners)
+			self._owners.append(player)
+			self._ownerIndexByName[player.name] = index
+			self._ownerColor.append(self._colorIndex.get(player.color, index % len(self._colors)))
+		return index
+
+	def ownerIndexByName(self, name : str) -> int:
+		return self._ownerIndexByName.get(name, EMPTY)
+
+	def ownerColorIndex(self, ownerIndex : int) -> int:
+		return self._ownerColor[ownerIndex]
+
+	def owner(self, ownerIndex : int) -> Optional[Player]:
+		if ownerIndex == EMPTY:
+			return None
+		return self._owners[ownerIndex]
+
+	def setSpot(self, index : int, ownerIndex : int, blocking : int) -> None:
+		if self._marks:
+			self._journal.append((False, index, self.spotOwner[index], self.spotBlocking[index]))
+		self._writeSpot(index, ownerIndex, blocking)
+
+	def setHouse(self, index : int, ownerIndex : int) -> None:
+		if self._marks:
+			self._journal.append((True, index, self.houseOwner[index], 0))
+		self._writeHouse(index, ownerIndex)
+
+	def _writeSpot(self, index : int, ownerIndex : int, blocking : int) -> None:
+		previousOwner = self.spotOwner[index]
+		if previousOwner != EMPTY:
+			self.hash ^= self._spotKeys[self._ownerColor[previousOwner]][index]
+			self._spotsOfColor[self._ownerColor[previousOwner]].discard(index)
+		if ownerIndex != EMPTY:
+			self.hash ^= self._spotKeys[self._ownerColor[ownerIndex]][index]
+			self._spotsOfColor[self._ownerColor[ownerIndex]].add(index)
+		if self.spotBlocking[index] != blocking:
+			self.hash ^= self._blockingKeys[index]
+		self.spotOwner[index] = ownerIndex
+		self.spotBlocking[index] = blocking
+		if blocking:
+			self.blockingMask |= 1 << index
+		else:
+			self.blockingMask &= ~(1 << index)
+
+	def _writeHouse(self, index : int, ownerIndex : int) -> None:
+		previousOwner = self.houseOwner[index]
+		if previousOwner != EMPTY:
+			self.hash ^= self._houseKeys[self._ownerColor[previousOwner]][index]
+			self._housePiecesOfColor[self._ownerColor[previousOwner]] -= 1
+			self._filledHousesOfColor[index // SPOTS_PER_HOUSE] -= 1
+		if ownerIndex != EMPTY:
+			self.hash ^= self._houseKeys[self._ownerColor[ownerIndex]][index]
+			self._housePiecesOfColor[self._ownerColor[ownerIndex]] += 1
+			self._filledHousesOfColor[index // SPOTS_PER_HOUSE] += 1
+		self.houseOwner[index] = ownerIndex
+		if ownerIndex != EMPTY:
+			self.houseMask |= 1 << index
+		else:
+			self.houseMask &= ~(1 << index)
+
+	def spotsOfColor(self, colorIndex : int) -> set[int]:
+		# indexes of the spots occupied by the pieces of a color, not to be modified
+		return self._spotsOfColor[colorIndex]
+
+	def piecesOfColor(self, colorIndex : int) -> int:
+		# number of pieces of a color on the board, houses included
+		return len(self._spotsOfColor[colorIndex]) + self._housePiecesOfColor[colorIndex]
+
+	def filledHouses(self, colorIndex : int) -> int:
+		# number of occupied houses of a color, whoever occupies them
+		return self._filledHousesOfColor[colorIndex]
+
+	def canonicalHash(self) -> int:
+		# Hash of the position which is the same for all the rotations of the board by a whole number of colors (with the colors
+		# of the owners rotated accordingly), i.e. the smallest of the hashes of the rotated positions. Computed from scratch.
+		numColors = len(self._colors)
+		result = None
+		for rotation in range(numColors):
+			spotShift = rotation * SPOTS_PER_REGION
+			houseShift = rotation * SPOTS_PER_HOUSE
+			h = 0
+			for index, owner in enumerate(self.spotOwner):
+				target = (index + spotShift) % self._numSpots
+				if owner != EMPTY:
+					h ^= self._spotKeys[(self._ownerColor[owner] + rotation) % numColors][target]
+				if self.spotBlocking[index]:
+					h ^= self._blockingKeys[target]
+			for index, owner in enumerate(self.houseOwner):
+				if owner != EMPTY:
+					h ^= self._houseKeys[(self._ownerColor[owner] + rotation) % numColors][(index + houseShift) % self._numHouses]
+			if result is None or h < result:
+				result = h
+		return result
+
+	def mark(self) -> int:
+		# Starts (or continues) recording changes and returns a token identifying the current state. Every mark gets a token of its
+		# own, even when nothing has changed since the previous one.
+		self._lastMark += 1
+		self._marks.append((self._lastMark, len(self._journal)))
+		return self._lastMark
+
+	def undo(self, token : int) -> None:
+		# Reverts every change recorded since the token was handed out, most recent first. The marks taken after it are released
+		# along with it, since the changes they would revert are gone.
+		position = self._releaseMark(token)
+		while len(self._journal) > position:
+			isHouse, index, previousOwner, previousBlocking = self._journal.pop()
+			if isHouse:
+				self._writeHouse(index, previousOwner)
+			else:
+				self._writeSpot(index, previousOwner, previousBlocking)
+
+	def commit(self, token : int) -> None:
+		# Keeps the changes done since the token was handed out. The log is only dropped once no mark is outstanding anymore:
+		# the changes committed for an inner mark can still be reverted by an outer one.
+		index = self._markIndex(token)
+		del self._marks[index]
+		if not self._marks:
+			self._journal = []
+
+	def _markIndex(self, token : int) -> int:
+		for index in range(len(self._marks) - 1, -1, -1):
+			if self._marks[index][0] == token:
+				return index
+		raise ValueError(f'Unknown board mark {token}')
+
+	def _releaseMark(self, token : int) -> int:
+		# releases the mark and the ones taken after it, and returns the position of the log it was taken at
+		index = self._markIndex(token)
+		position = self._marks[index][1]
+		del self._marks[index:]
+		return position
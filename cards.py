@@ -1,4 +1,5 @@
 from __future__ import annotations
+from typing import Optional
 
 from hand import Hand
 from params import *
@@ -7,25 +8,50 @@ import random
 
 
 class Deck:
-	def __init__(self):
-		self._cards = [Card(suit, value, self) for value in VALUES for suit in SUITS]
-		random.shuffle(self._cards)
+	# The cards never move: the deck is an array of card indexes shuffled once, and drawing a card moves a cursor along it.
+	# The shuffles use a random generator of its own, so that the cards dealt in a game can be replayed from its seed.
+	def __init__(self, seed : int = None):
+		if seed is None:
+			seed = random.SystemRandom().getrandbits(64)
+		self._seed = seed
+		self._rng = random.Random(seed)
+
+		self._allCards = CARDS
+		self._order = list(range(len(self._allCards)))
+		self._rng.shuffle(self._order)
+		self._cursor = 0
 
 		self._discardPile = []
 		self._player = None
 
-	def drawHand(self, number_of_cards : int, player : Player) -> Hand:
+	@property
+	def seed(self) -> int:
+		return self._seed
+
+	@property
+	def remaining(self) -> int:
+		return len(self._order) - self._cursor
+
+	def drawHand(self, number_of_cards : int, player : Player, handClass : type = Hand) -> Hand:
 		if not number_of_cards in [4, 5]:
 			raise Exception(f'A hand with {number_of_cards} was requested: that\'s not possible...')
 		else:
-			temp = []
-			for n in range(number_of_cards):
-				picked_card = random.choice(self._cards)
-				remaining_cards = [card for card in self._cards if card != picked_card]
-				self._cards = remaining_cards
-				temp.append(picked_card)
+			if self.remaining < number_of_cards:
+				self._reshuffleDiscardPile()
+			if self.remaining < number_of_cards:
+				raise Exception(f'A hand with {number_of_cards} was requested but only {self.remaining} cards are left in the deck')
+			temp = [self._allCards[index] for index in self._order[self._cursor:self._cursor + number_of_cards]]
+			self._cursor += number_of_cards
 			self._player = player
-			return Hand(player, temp)
+			return handClass(player, temp)
+
+	def _reshuffleDiscardPile(self) -> None:
+		# the discarded cards are shuffled and put under the cards which are left
+		discarded = [card.index for card in self._discardPile]
+		self._rng.shuffle(discarded)
+		self._order = self._order[self._cursor:] + discarded
+		self._cursor = 0
+		self._discardPile = []
 
 	@property
 	def discardPile(self) -> list[Card]:
@@ -38,45 +64,58 @@ class Deck:
 		for card in hand.cards:
 			self._discardPile.append(card)
 
-	def reset(self, players) -> None:
-		player_index = 0
-		temp_hands = []
-		for card in self._discardPile:
-			temp_hands.append(card)
-			player_index += 1
-			if player_index == NUMBER_OF_PLAYERS:
-				player_index = 0
-
-		for index, player in enumerate(players):
-			player.setHand(temp_hands[index])
+	def getSnapshot(self) -> dict:
+		# everything needed to go on dealing the same cards, random generator included (see loadSnapshot())
+		version, internalState, gauss = self._rng.getstate()
+		return {"seed": self._seed, "order": self._order, "cursor": self._cursor, "discard": [card.index for card in self._discardPile], "rng": [version, list(internalState), gauss]}
+
+	def loadSnapshot(self, snapshot : dict) -> None:
+		self._seed = snapshot['seed']
+		self._order = list(snapshot['order'])
+		self._cursor = snapshot['cursor']
+		self._discardPile = [self._allCards[index] for index in snapshot['discard']]
+		version, internalState, gauss = snapshot['rng']
+		self._rng.setstate((version, tuple(internalState), gauss))
+
+	def reset(self) -> None:
+		# all the cards are put back in the deck and shuffled, for a new game
+		self._order = list(range(len(self._allCards)))
+		self._rng.shuffle(self._order)
+		self._cursor = 0
+		self._discardPile = []
 
 
 class Card:
-	def __init__(self, suit : str, value : str, deck : Deck = None):
-		self._suit = suit
-		self._value = value
-		self._deck = deck
+	# Cards are interned: Card(suit, value) always returns the same instance for the same card, which is created once along
+	# with everything derived from it (numeric value, index in the deck order, JSON payload). Two cards are therefore equal
+	# only if they are the same object.
+	_instances = {}
+
+	def __new__(cls, suit : str, value : str):
+		card = cls._instances.get((suit, value))
+		if card is None:
+			card = super().__new__(cls)
+			card._suit = suit
+			card._value = value
+			card._numValue = NUM_VALUES.get(value, 0)
+			card._index = VALUES.index(value) * len(SUITS) + SUITS.index(suit) if value in VALUES and suit in SUITS else -1
+			card._json = {"suit": suit, "value": value}
+			card._hash = hash((suit, value))
+			cls._instances[(suit, value)] = card
+		return card
+
+	def __reduce__(self):
+		# copies and unpickled cards are the interned instance as well
+		return (Card, (self._suit, self._value))
 
 	def __str__(self) -> str:
 		return f'{self._suit}{self._value}'
 
 	def __eq__(self, other) -> bool:
-		#print('Call to Card.__eq__')
-		if isinstance(other, Card):
-		#	print('The other is indeed a Card')
-		#	print(f'self.suit = {self.suit}')
-		#	print(f'self.value = {self.value}')
-		#	print(f'other.suit = {other.suit}')
-		#	print(f'other.value = {other.value}')
-		#	print(f'result = {self.suit == other.suit and self.value == other.value}')
-			
-			return self.suit == other.suit and self.value == other.value
-		return False
+		return self is other
 
 	def __hash__(self):
-		#print('Call to Card.__hash__')
-		#print(f'result = {hash((self.suit, self.value))}')
-		return hash((self.suit, self.value))
+		return self._hash
 
 	@property
 	def value(self) -> str:
@@ -88,21 +127,29 @@ class Card:
 
 	@property
 	def json(self) -> dict:
-		return {"suit": self._suit, "value": self._value}
+		# shared by all the messages about this card, it must not be modified
+		return self._json
 
 	@property
 	def numValue(self) -> int:
-		if self._value in [str(i) for i in range(1, 10)]:
-			return int(self._value)
-		elif self._value == 'T':
-			return 10
-		elif self._value == 'J':
-			return 11
-		elif self._value == 'Q':
-			return 12
-		elif self._value == 'K':
-			return 13
-		elif self._value == 'A':
-			return 11
-		else:
-			return 0
\ No newline at end of file
+		return self._numValue
+
+	@property
+	def index(self) -> int:
+		# position of the card in the deck order (VALUES then SUITS), -1 for the special cards
+		return self._index
+
+
+# numeric value of each card value ('1' being the one-step card of the seven splits)
+NUM_VALUES = {str(i): i for i in range(1, 10)}
+NUM_VALUES.update({'T': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 11})
+
+CARDS = [Card(suit, value) for value in VALUES for suit in SUITS]
+_cardsByKey = {(card.suit, card.value): card for card in CARDS}
+
+
+def decodeCard(data) -> Optional[Card]:
+	# Card of a message such as {"type": "card_selection", "suit": ..., "value": ...}, or None if it is not a valid card
+	if not isinstance(data, dict):
+		return None
+	return _cardsByKey.get((data.get('suit'), data.get('value')))
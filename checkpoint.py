@@ -0,0 +1,62 @@
+from __future__ import annotations
+from typing import Optional
+
+import json
+import sqlite3
+import threading
+import time
+
+from params import *
+
+# The games in progress are saved in a SQLite database when the server stops, and loaded back one by one, the first time one
+# of their players reconnects: starting the server does not depend on how many games are saved.
+
+
+class CheckpointStore:
+	# The database is opened in WAL mode, so that saving every game at shutdown is a single sequential write and loading a game
+	# never waits for it. Calls may come from several threads (see asyncio.to_thread), they are serialized by a lock.
+	def __init__(self, path : str = CHECKPOINT_PATH):
+		self._path = path
+		self._connection = None
+		self._lock = threading.Lock()
+
+	def _connect(self) -> sqlite3.Connection:
+		if self._connection is None:
+			self._connection = sqlite3.connect(self._path, check_same_thread = False)
+			self._connection.execute('PRAGMA journal_mode=WAL')
+			self._connection.execute('PRAGMA synchronous=NORMAL')
+			self._connection.execute('CREATE TABLE IF NOT EXISTS games (id TEXT PRIMARY KEY, data TEXT NOT NULL, saved_at REAL NOT NULL)')
+			self._connection.commit()
+		return self._connection
+
+	def saveAll(self, checkpoints : dict[str, dict]) -> None:
+		# all the games are saved in one transaction
+		savedAt = time.time()
+		rows = [(gameId, json.dumps(checkpoint, separators = (',', ':'), ensure_ascii = False), savedAt) for gameId, checkpoint in checkpoints.items()]
+		with self._lock:
+			connection = self._connect()
+			with connection:
+				connection.executemany('INSERT OR REPLACE INTO games (id, data, saved_at) VALUES (?, ?, ?)', rows)
+
+	def load(self, gameId : str) -> Optional[dict]:
+		with self._lock:
+			row = self._connect().execute('SELECT data FROM games WHERE id = ?', (gameId,)).fetchone()
+		if row is None:
+			return None
+		return json.loads(row[0])
+
+	def contains(self, gameId : str) -> bool:
+		with self._lock:
+			return self._connect().execute('SELECT 1 FROM games WHERE id = ?', (gameId,)).fetchone() is not None
+
+	def delete(self, gameId : str) -> None:
+		with self._lock:
+			connection = self._connect()
+			with connection:
+				connection.execute('DELETE FROM games WHERE id = ?', (gameId,))
+
+	def close(self) -> None:
+		with self._lock:
+			if self._connection is not None:
+				self._connection.close()
+				self._connection = None
@@ -0,0 +1,202 @@
+from __future__ import annotations
+from typing import Optional, Tuple, Iterator
+
+from board import Board
+from cards import Deck, Card
+from hand import Hand
+from move import Move
+from seven import SevenSplitEnumerator
+from params import *
+
+# The rules of the game, without any I/O: every function takes the state of a table, updates it and returns it along with the
+# events describing the changes made to the table, without any text (the client derives it). The async Game class drives these
+# functions and sends the events of each step as one delta, made of their fields (distinct within a step), while simulations
+# and bots can call them directly, thousands of times per second.
+
+
+class TableState:
+	# Everything the rules need to know about a game in progress. The players are seat-ordered: the first one is the dealer
+	# and they play in that order.
+	def __init__(self, board : Board, deck : Deck, players : list[Player] = None):
+		self.board = board
+		self.deck = deck
+		self.players = players or []
+		self.activePlayerIndex = -1
+		self.handsFinished = 0
+		self.isFinished = False
+		self.winners = None
+		# names of the players who filled their houses and now play with their teammate's pieces
+		self.takenOver = set()
+		# class of the hands dealt (Hand, or BitHand for simulations)
+		self.handClass = Hand
+
+	@property
+	def activePlayer(self) -> Optional[Player]:
+		if self.activePlayerIndex < 0:
+			return None
+		return self.players[self.activePlayerIndex]
+
+	@property
+	def dealer(self) -> Player:
+		return self.players[0]
+
+	def getTeammate(self, player : Player) -> Optional[Player]:
+		for player2 in self.players:
+			if player2 != player and player2.team == player.team:
+				return player2
+		return None
+
+
+def newTable(colors : list[str], players : list[Player], deck : Deck = None) -> TableState:
+	board = Board(colors)
+	for player in players:
+		player.setBoard(board)
+	return TableState(board, deck or Deck(), players)
+
+
+def nextDealer(state : TableState) -> Tuple[TableState, list[dict]]:
+	state.players = state.players[1:] + state.players[:1]
+	state.players[0].setDealer()
+	return state, [{"type": "dealer", "dealer": state.players[0].name}]
+
+
+def dealHands(state : TableState, numberOfCards : int) -> Tuple[TableState, list[dict]]:
+	# The hands are private, so no event is returned: the caller decides how (and whether) to show them.
+	for player in state.players:
+		player.assignHand(state.deck.drawHand(numberOfCards, player, state.handClass))
+	return state, []
+
+
+def exchangeCards(state : TableState, player1 : Player, card1 : Card, player2 : Player, card2 : Card) -> Tuple[TableState, list[dict]]:
+	player1.hand.discardFromHand(card1)
+	player1.hand.addToHand(card2)
+	player2.hand.discardFromHand(card2)
+	player2.hand.addToHand(card1)
+	return state, []
+
+
+def startRound(state : TableState) -> Tuple[TableState, list[dict]]:
+	state.activePlayerIndex = -1
+	state.handsFinished = 0
+	return state, []
+
+
+def isRoundFinished(state : TableState) -> bool:
+	return state.isFinished or state.handsFinished >= len(state.players)
+
+
+def startTurn(state : TableState) -> Tuple[TableState, list[dict]]:
+	state.activePlayerIndex = (state.activePlayerIndex + 1) % len(state.players)
+	player = state.activePlayer
+	if player.hand.size > 0:
+		return state, [{"type": "turn", "turn": player.name}]
+	return state, [{"type": "turn", "turn": player.name, "folded": True}]
+
+
+def getPiecesOwner(state : TableState, player : Player) -> Player:
+	# A player who has filled all his/her houses plays using his/her teammate's pieces
+	if player.name in state.takenOver:
+		return state.getTeammate(player)
+	return player
+
+
+def legalMoves(state : TableState) -> list[Move]:
+	player = state.activePlayer
+	if player.hand.size == 0:
+		return []
+	owner = getPiecesOwner(state, player)
+	if owner is player:
+		return player.hand.getAllPossibleMoves(state.board)
+	return state.board.getMoveOptionsForHand(owner, player.hand.cards)
+
+
+def iterLegalMoves(state : TableState) -> Iterator[Move]:
+	# Same moves as legalMoves(), generated as they are consumed
+	player = state.activePlayer
+	if player.hand.size == 0:
+		return iter(())
+	return state.board.iterMoveOptionsForHand(getPiecesOwner(state, player), player.hand.cards)
+
+
+def atMostNLegalMoves(state : TableState, n : int) -> list[Move]:
+	# Up to n of the legal moves, without generating the others: 0 means the player must fold, and when asked for 2 moves,
+	# getting a single one means it is forced.
+	player = state.activePlayer
+	if player.hand.size == 0:
+		return []
+	return state.board.getFirstMoveOptions(getPiecesOwner(state, player), player.hand.cards, n)
+
+
+def anyLegalMove(state : TableState) -> bool:
+	return len(atMostNLegalMoves(state, 1)) > 0
+
+
+def sevenSplits(state : TableState, move : Move) -> list[SevenSplit]:
+	return SevenSplitEnumerator(state.board, move.player).outcomes()
+
+
+def playMove(state : TableState, move : Optional[Move], sevenSplit : SevenSplit = None) -> Tuple[TableState, list[dict]]:
+	# Plays the move chosen by the active player, or folds his/her hand if move is None (no available move).
+	# For a SEVEN move, sevenSplit is the way the seven is played (the first possible one is used if none is given).
+	player = state.activePlayer
+	events = []
+	if move is None:
+		events.append({"type": "fold", "fold": player.name})
+		state.deck.discardCards(player.hand)
+		player.hand.fold()
+	else:
+		# have the player discard the card from his hand and put it in the discard pile of the deck
+		player.discard(move.card)
+		state.deck.discardCard(move.card)
+
+		# the pieces moved are the ones of move.player, which is the teammate when the active player has filled his/her houses.
+		# A piece on the target is kicked by being replaced, the board keeps count of the pieces of each player.
+		owner = move.player
+		event = {"type": "move", "by": player.name, "card": [move.card.value, move.card.suit], "move": [move.ID, str(move.originSpot) if move.originSpot else None, str(move.targetSpot) if move.targetSpot else None, owner.name]}
+		events.append(event)
+		if move.ID in ['OUT', 'MOVE', 'BACK'] and move.targetSpot.isOccupied:
+			event['kicked'] = [move.targetSpot.occupant.name]
+		if move.ID == 'OUT':
+			move.targetSpot.setOccupant(owner, True)
+		elif move.ID in ['MOVE', 'BACK']:
+			move.originSpot.setEmpty()
+			move.targetSpot.setOccupant(owner)
+		elif move.ID == 'SWITCH':
+			move.originSpot.setOccupant(move.targetSpot.occupant)
+			move.targetSpot.setOccupant(owner)
+		elif move.ID == 'ENTER':
+			move.originSpot.setEmpty()
+			move.targetSpot.setOccupant(owner)
+		elif move.ID == 'SEVEN':
+			if sevenSplit is None:
+				sevenSplit = sevenSplits(state, move)[0]
+			# the steps are applied one by one, kicking any piece met along the way
+			event['steps'] = []
+			for step in sevenSplit.moves:
+				event['steps'].append([str(step.originSpot), str(step.targetSpot)])
+				if step.targetSpot.isOccupied:
+					event.setdefault('kicked', []).append(step.targetSpot.occupant.name)
+				step.originSpot.setEmpty()
+				step.targetSpot.setOccupant(owner)
+		event['cardsLeft'] = player.hand.size
+
+	if player.hand.size == 0:
+		state.handsFinished += 1
+
+	return state, events
+
+
+def endTurn(state : TableState) -> Tuple[TableState, list[dict]]:
+	# When a player manages to fill all his/her houses, he/she goes on with the teammate's pieces, unless the teammate's
+	# houses are all filled as well, in which case the game is won.
+	player = state.activePlayer
+	teammate = state.getTeammate(player)
+	events = []
+	if state.board.areAllHouseFilled(player.color) and state.board.areAllHouseFilled(teammate.color):
+		events.append({"type": "win", "winners": [player.name, teammate.name]})
+		state.isFinished = True
+		state.winners = (player, teammate)
+	elif player.name not in state.takenOver and state.board.areAllHouseFilled(player.color):
+		events.append({"type": "takeover", "takeover": player.name})
+		state.takenOver.add(player.name)
+	return state, events
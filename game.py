@@ -4,33 +4,46 @@ import asyncio
 from typing import Optional, Tuple
 
 from board import Board
-from cards import Deck, Card
-from hand import Hand
+from cards import Deck
 from params import *
 from player import Player
+from journal import GameJournal, playerRecord, moveRecord, snapshotTable
+import engine
+
+# Name of each of the three rounds of a game, and whether it is the first one (where five cards are dealt instead of four)
+ROUNDS = [('First', True), ('Second', False), ('Third', False)]
 
 
 class Game:
-	def __init__(self, gameSession : GameSession, colors : List):
+	# The rules themselves live in engine.py, this class drives them for a game played through the GameSession: it asks the
+	# players for their decisions and broadcasts the events returned by the engine.
+	def __init__(self, gameSession : GameSession, colors : List, seed : int = None, journal : GameJournal = None, state : engine.TableState = None):
 		self._gameSession = gameSession
-		self._board = Board(colors)
-		self._deck = Deck()
+		# a game restored from a snapshot is given its table as it was (see restore())
+		self._state = state or engine.TableState(Board(colors), Deck(seed))
+		# the cards dealt during the game can be replayed from this seed
+		print(f'[Game] Deck seed: {self.deck.seed}')
 		self._isStarted = False
-		self._isFinished = False
 		self._numPlayers = 0
-		self._players = []
-		self._handsFinished = 0
-		self._activePlayerIndex = -1
-		self._activePlayer = None
+		# every decision taken in the game is recorded in the journal (if any), see journal.py
+		self._journal = journal
+		# Where the game is at: the round being played and its phase ('deal', 'exchange' with the names of the players who have
+		# already exchanged their cards, then 'turns'). During a turn, _turnStartIndex is the index of the previous player, the
+		# turn being played over again if the game is stopped and restored before the move is played.
+		self._roundIndex = 0
+		self._phase = 'deal'
+		self._exchanged = set()
+		self._turnStartIndex = None
 
 	def __str__(self) -> str:
 		s = f'This game has {self._numPlayers} players.\r\n'
 		for i in range(0, self._numPlayers):
-			s += f'Player {i} : {str(self._players[i])}'
+			s += f'Player {i} : {str(self.players[i])}'
 			s += '\r\n'
 		return s
 
-	async def broadcast(self, msg: str):
+	async def broadcast(self, msg: dict):
+		# messages which do not change the game (logs), the changes are sent as deltas by broadcastEvents()
 		await self._gameSession.broadcast(msg)
 
 	def printNumPlayers(self) -> None:
@@ -40,13 +53,17 @@ class Game:
 	def numPlayers(self) -> int:
 		return self._numPlayers
 
+	@property
+	def state(self) -> engine.TableState:
+		return self._state
+
 	@property
 	def board(self) -> Board:
-		return self._board
+		return self._state.board
 
 	@property
 	def deck(self) -> Deck:
-		return self._deck
+		return self._state.deck
 
 	@property
 	def isStarted(self) -> bool:
@@ -54,30 +71,27 @@ class Game:
 
 	@property
 	def isFinished(self) -> bool:
-		return self._isFinished
+		return self._state.isFinished
 
 	@property
 	def players(self) -> list[Player]:
-		return self._players
+		return self._state.players
 
 	@property
 	def activePlayer(self) -> Player:
-		return self._activePlayer
+		return self._state.activePlayer
 
 	def getTeammate(self, player) -> Optional[Player]:
-		for player2 in self._players:
-			if player2 != player and player2.team == player.team:
-				return player2
-		return None
+		return self._state.getTeammate(player)
 
 	@property
 	def dealer(self) -> Player:
-		return self._players[0]
+		return self._state.dealer
 
 	def getPlayersInTeams(self) -> list[Tuple[Player, Player]]:
 		seen_players = set()
 		res = []
-		for player in self._players:
+		for player in self.players:
 			if player in seen_players:
 				continue
 			teammate = self.getTeammate(player)
@@ -87,36 +101,59 @@ class Game:
 				seen_players.add(teammate)
 		return res
 
-	def resetActivePlayerIndex(self) -> None:
-		self._activePlayerIndex = -1
-
-	def setPlayers(self, players : list[Player]) -> None:
-		# self._players is an ordered array, where the first element is always the dealer and where the players are always positioned in the order in which they play
-		self._numPlayers = len(players)
-		self._players = players
-		self._players[0].setDealer()
-		for player in self._players:
-			player.setBoard(self._board) 
+	def record(self, kind : str, **data) -> None:
+		if self._journal is not None:
+			self._journal.record(kind, **data)
 
-	async def nextDealer(self) -> None:
-		self._players = self._players[1:] + self._players[:1]
-		self._players[0].setDealer()
-		await self.broadcast({"type": "dealer", "playerId": self._players[0].name})
-
-	async def drawHands(self, first_round : bool) -> None:
-		if first_round:
+	@property
+	def journal(self) -> Optional[GameJournal]:
+		return self._journal
+
+	def snapshot(self) -> dict:
+		# state of the game from which it can be rebuilt (see restore() and journal.rebuildTable). The engine steps are never
+		# interrupted, so the table is always in a consistent state, only a turn in progress has to be rolled back.
+		table = snapshotTable(self._state)
+		if self._turnStartIndex is not None:
+			table['active'] = self._turnStartIndex
+		return {"round": self._roundIndex, "phase": self._phase, "exchanged": sorted(self._exchanged), "table": table}
+
+	def restore(self, snapshot : dict) -> None:
+		# puts the game back where it was when the snapshot was taken, play() then goes on from there (the table itself is
+		# given to the constructor)
+		self._isStarted = True
+		self._roundIndex = snapshot['round']
+		self._phase = snapshot['phase']
+		self._exchanged = set(snapshot['exchanged'])
 
-			await self._players[0].setHand(Hand(self._players[0], [Card("♥️", "A", self._deck), Card("♥️", "K", self._deck), Card("♥️", "Q", self._deck), Card("♥️", "T", self._deck), Card("♥️", "J", self._deck)]))
+	def snapshotIfDue(self) -> None:
+		if self._journal is not None and self._journal.isSnapshotDue:
+			self._journal.snapshot(self.snapshot())
 
-			for player in self._players[1:]:
-				hand = self._deck.drawHand(5, player)
-				await player.setHand(hand)
+	async def broadcastEvents(self, events : list[dict]) -> None:
+		# the events of one step of the engine make up a single delta
+		if events:
+			await self._gameSession.publish(events)
 
+	def setPlayers(self, players : list[Player]) -> None:
+		# self._state.players is an ordered array, where the first element is always the dealer and where the players are always positioned in the order in which they play
+		self._numPlayers = len(players)
+		self._state.players = players
+		players[0].setDealer()
+		for player in players:
+			player.setBoard(self.board)
 
-		else:
-			for player in self._players:
-				hand = self._deck.drawHand(4, player)
-				await player.setHand(hand)
+	async def nextDealer(self) -> None:
+		_, events = engine.nextDealer(self._state)
+		self.record('dealer')
+		await self.broadcastEvents(events)
+
+	def dealHands(self, first_round : bool) -> None:
+		# the hands are only sent to the players afterwards (see runRound)
+		numberOfCards = 5 if first_round else 4
+		for player in self.players:
+			hand = self.deck.drawHand(numberOfCards, player)
+			self.record('deal', p=player.name, cards=[card.index for card in hand.cards])
+			player.assignHand(hand)
 
 	async def requestCardExchange(self, players: Tuple[Player, Player]) -> None:
 		player1, player2 = players
@@ -125,124 +162,95 @@ class Game:
 			player2.requestCardExchange()
 		)
 
-		await player1.switchCard(card1, card2)
-		await player2.switchCard(card2, card1)
+		engine.exchangeCards(self._state, player1, card1, player2, card2)
+		self._exchanged.update([player1.name, player2.name])
+		self.record('exchange', p1=player1.name, c1=card1.index, p2=player2.name, c2=card2.index)
+		await player1.notifyCardSwitch(card1, card2)
+		await player2.notifyCardSwitch(card2, card1)
 
 	async def runRound(self, round_name : str, first_round : bool) -> None:
-		await self.broadcast({"type": "log", "msg": f"Starting {round_name} round with player {self.dealer} as the dealer.\n"})
-		self.resetActivePlayerIndex()
-		await self.drawHands(first_round)
-
-		teams = self.getPlayersInTeams()
-		team0 = teams[0]
-		team1 = teams[1]
-
-		await asyncio.gather(
-			self.requestCardExchange(team0),
-			self.requestCardExchange(team1)
-		)
-
-		self._handsFinished = 0
-		while self._handsFinished < self._numPlayers:
+		# picks the round up at its current phase, which is 'deal' unless the game has been restored
+		if self._phase == 'deal':
+			await self.broadcast({"type": "log", "msg": f"Starting {round_name} round with player {self.dealer} as the dealer.\n"})
+			engine.startRound(self._state)
+			self.record('round', i=self._roundIndex)
+			self.dealHands(first_round)
+			self._phase = 'exchange'
+			self._exchanged = set()
+			for player in self.players:
+				await player.setHand(player.hand)
+
+		if self._phase == 'exchange':
+			await asyncio.gather(*[self.requestCardExchange(team) for team in self.getPlayersInTeams() if team[0].name not in self._exchanged])
+			self._phase = 'turns'
+
+		while not engine.isRoundFinished(self._state):
 			await self.nextPlayer()
 		await self.broadcast({"type": "log", "msg": f"{round_name} round is finished."})
 
 	async def start(self) -> None:
 		self._isStarted = True
 
-		self._players[0].setDealer()
-		await self.broadcast({"type": "dealer", "playerId": self._players[0].name})
-
-		while not self._isFinished:
-			await self.runRound('First', first_round = True)
-			await self.runRound('Second', first_round = False)
-			await self.runRound('Third', first_round = False)
+		self.players[0].setDealer()
+		# recorded before anything is awaited, so that a game saved from here on always has a journal to be rebuilt from
+		self.record('start', seed=self.deck.seed, colors=self.board.state.colors, players=[playerRecord(player) for player in self.players])
+		await self.broadcastEvents([{"type": "dealer", "dealer": self.players[0].name}])
+		await self.play()
+
+	async def play(self) -> None:
+		# Plays the rounds until the game is won, from the round and phase the game is at (the start of the first round, unless
+		# the game has been restored). After the third round, the deck is reset and the next dealer goes on with the first one.
+		while not self.isFinished:
+			round_name, first_round = ROUNDS[self._roundIndex]
+			await self.runRound(round_name, first_round = first_round)
+			if self.isFinished:
+				break
+
+			self._phase = 'deal'
+			if self._roundIndex < len(ROUNDS) - 1:
+				self._roundIndex += 1
+			else:
+				self._roundIndex = 0
+				self.deck.reset()
+				self.record('reset')
+				await self.nextDealer()
 
-			self._deck.reset(self.players)
-			self.nextDealer()
-			await self.start()
+		self.record('end', winners=[player.name for player in self._state.winners or []])
+		if self._journal is not None:
+			self._journal.close()
 
 	async def nextPlayer(self) -> None:
-		self._activePlayerIndex += 1
-		if self._activePlayerIndex == NUMBER_OF_PLAYERS:
-			self._activePlayerIndex = 0
-		self._activePlayer = self._players[self._activePlayerIndex]
-
-		if self._activePlayer.hand.size > 0:
-			await self.broadcast({"type": "next-player", "playerId": self._activePlayer.name, "msg": f"Moving on to next player: {str(self._activePlayer)}"})
-
-			moveOptions = self._activePlayer.hand.getAllPossibleMoves(self._board)
-			if len(moveOptions) == 0:
-				# player has no available move, he must fold his hand
-				await self.broadcast({"type": "fold", "playerId": self._activePlayer.name, "msg": f"Player has no available move and must fold."})
-				self._deck.discardCards(self._activePlayer.hand)
-				await self._activePlayer.foldHand()
-			else:
-				if len(moveOptions) == 1:
-					# player has only one move and therefore MUST play it
-					moveChoice = moveOptions[0]
-					moveChoice.updateDescription()
-					await self._activePlayer.send_message_to_user({"type": "forced-play", "msg": f"You only have one available move and therefore must play it.", "playerId": self._activePlayer.name, "value": moveChoice.card.value, "suit": moveChoice.card.suit, "origin": str(moveChoice.originSpot), "target": str(moveChoice.targetSpot)})
-				else:
-					# player has several possible moves and is prompted to select one
-					moveChoice = await self._activePlayer.getMoveChoiceFromPlayer(moveOptions)
-
-				cardChoice = moveChoice.card
-				await self.broadcast({"type": "play", "msg": f"Player {self._activePlayer.name} has selected the following move: {str(moveChoice)}", "playerId": self._activePlayer.name, "value": moveChoice.card.value, "suit": moveChoice.card.suit, "origin": str(moveChoice.originSpot), "target": str(moveChoice.targetSpot)})
-
-				if moveChoice.ID in ['OUT', 'MOVE', 'SWITCH', 'BACK', 'ENTER']:
-					# have the player discard the card from his hand
-					self._activePlayer.discard(cardChoice)
-					# and put the card in the discard pile of the deck
-					self._deck.discardCard(cardChoice)
-
-					origin = self._board.getSpot(moveChoice.originSpot.color, moveChoice.originSpot.number)
-					target = self._board.getSpot(moveChoice.targetSpot.color, moveChoice.targetSpot.number)
-					
-					# player decided to take a piece out
-					if moveChoice.ID == 'OUT':
-						self._activePlayer.addAPieceOnTheBoard()
-						target.setOccupant(self._activePlayer, True)
-
-					# player decided to move a piece forward or backward
-					if moveChoice.ID in ['MOVE', 'BACK']:
-						origin.setEmpty()
-						kickedPlayer = target.setOccupant(self._activePlayer)
-						if not kickedPlayer is None:
-							kickedPlayer.removeAPieceFromTheBoard()
-
-					# player decided to switch two pieces
-					if moveChoice.ID == 'SWITCH':
-						origin.setOccupant(moveChoice.targetSpot.occupant)
-						target.setOccupant(self._activePlayer)
-
-					# player decided to move a piece into a house
-					if moveChoice.ID == 'ENTER':
-						# Re-getting the target spot because it's now a house, not a spot !
-						target = self._board.getHouse(moveChoice.targetSpot.color, moveChoice.targetSpot.number)
-						origin.setEmpty()
-						target.setOccupant(self._activePlayer)
-
-				elif moveChoice.ID == 'SEVEN':
-					self._activePlayer.getSevenMoveFromPlayer(self._board)
-
-			if self._activePlayer.hand.size == 0:
-				self._handsFinished += 1
-
-			await self.broadcast({"type": "log", "msg": f"End of turn for player {self._activePlayer.name}.\n"})
-			#await self.broadcast(f'\nState of the board:\n{str(self._board)}')
-		else:
-			await self.broadcast({"type": "log", "msg": f"Next player: {self._activePlayer.name} has folded in a previous turn, moving on...\n"})
-
-
-		# When a player manages to fill all his/her houses:
-		if self._board.areAllHouseFilled(self._activePlayer.color):
-			await self.broadcast({"type": "log", "msg": f"Player {self._activePlayer.name} has filled all houses!)"})
-
-			teammate = self.getTeammate(self._activePlayer)
-			# If the teammate's houses are all filled as well, the game is won!
-			if self._board.areAllHouseFilled(teammate.color):
-				await self.broadcast({"type": "log", "msg": f"Players {self._activePlayer.name} and {teammate.name} win!!!"})
-			else:
-				await self.broadcast({"type": "log", "msg": f"This player will now play using his/her teammate\'s pieces and attempt to win the game."})
-				self._activePlayer.color = self.getTeammate(self._activePlayer).color
+		self._turnStartIndex = self._state.activePlayerIndex
+		_, events = engine.startTurn(self._state)
+		await self.broadcastEvents(events)
+
+		activePlayer = self.activePlayer
+		turn = {}
+		events = []
+		if activePlayer.hand.size > 0:
+			# the whole list of moves is only needed when the player has a choice to make
+			moveOptions = engine.atMostNLegalMoves(self._state, 2)
+			moveChoice = None
+			sevenSplit = None
+			if len(moveOptions) == 1:
+				# player has only one move and therefore MUST play it
+				moveChoice = moveOptions[0]
+				await activePlayer.send_message_to_user({"type": "forced-play", "msg": f"You only have one available move and therefore must play it.", "playerId": activePlayer.name, "value": moveChoice.card.value, "suit": moveChoice.card.suit, "origin": str(moveChoice.originSpot), "target": str(moveChoice.targetSpot)})
+			elif len(moveOptions) > 1:
+				# player has several possible moves and is prompted to select one
+				moveChoice = await activePlayer.getMoveChoiceFromPlayer(engine.legalMoves(self._state))
+
+			if not moveChoice is None and moveChoice.ID == 'SEVEN':
+				sevenSplit = await activePlayer.getSevenMoveFromPlayer(self.board, moveChoice.player)
+
+			# when there is no available move (moveChoice is None), the engine folds the player's hand
+			# recorded before being played, since the move is described by the spots as they are now
+			turn['m'] = moveRecord(moveChoice, sevenSplit) if moveChoice else None
+			_, events = engine.playMove(self._state, moveChoice, sevenSplit)
+
+		# the move and the end of the turn are applied together, the turn is then over
+		_, endEvents = engine.endTurn(self._state)
+		self._turnStartIndex = None
+		self.record('turn', p=activePlayer.name, **turn)
+		self.snapshotIfDue()
+		await self.broadcastEvents(events + endEvents)
@@ -0,0 +1,110 @@
+from __future__ import annotations
+from typing import Optional
+
+from params import *
+
+MIN_DISTANCE = -4
+MAX_DISTANCE = 13
+
+# For every card value: the distances a piece can move forward, the distances it can move backward, and whether the card
+# can take a piece out. The special '1' card is used for the one-step moves of a seven split.
+CARD_DISTANCES = {
+	'A': ((1, 11), (), True),
+	'K': ((13,), (), True),
+	'Q': ((12,), (), False),
+	'T': ((10,), (), False),
+	'9': ((9,), (), False),
+	'8': ((8,), (), False),
+	'6': ((6,), (), False),
+	'5': ((5,), (), False),
+	'4': ((4,), (-4,), False),
+	'3': ((3,), (), False),
+	'2': ((2,), (), False),
+	'1': ((1,), (), False),
+}
+
+
+class BoardGeometry:
+	# Everything about the board which only depends on the order of the colors is computed once here: for each spot index
+	# and each distance, the spot reached by moving that far and, for each player color, the house reached (if any).
+	def __init__(self, colors : list[str]):
+		self._colors = colors
+		self._numSpots = SPOTS_PER_REGION * len(colors)
+		self._numHouses = SPOTS_PER_HOUSE * len(colors)
+		distances = range(MIN_DISTANCE, MAX_DISTANCE + 1)
+
+		self._targets = [[(spotIndex + distance) % self._numSpots for distance in distances] for spotIndex in range(self._numSpots)]
+
+		# Bitmasks (bit i for spot i) of the spots a piece goes through when moving: (origin, target] going forward, and
+		# [target, origin) going backward. They are tested against BoardState.blockingMask.
+		self._allSpotsMask = (1 << self._numSpots) - 1
+		self._pathMasks = [[self._makePathMask(spotIndex, distance) for distance in distances] for spotIndex in range(self._numSpots)]
+
+		# Bitmasks (bit i for house i) of the houses of the same color that come before each house, to be tested against BoardState.houseMask.
+		self._housesBeforeMasks = [((1 << (houseIndex % SPOTS_PER_HOUSE)) - 1) << (houseIndex - houseIndex % SPOTS_PER_HOUSE) for houseIndex in range(self._numHouses)]
+
+		self._houses = []
+		for colorIndex in range(len(colors)):
+			previousColorIndex = (colorIndex - 1) % len(colors)
+			firstHouseIndex = colorIndex * SPOTS_PER_REGION
+			housesForColor = []
+			for spotIndex in range(self._numSpots):
+				housesForSpot = []
+				for distance in distances:
+					house = None
+					# houses are only reachable from spots just before the player's own color
+					if distance > 0 and spotIndex // SPOTS_PER_REGION == previousColorIndex:
+						targetIndex = (spotIndex + distance) % self._numSpots
+						if firstHouseIndex <= targetIndex < firstHouseIndex + SPOTS_PER_HOUSE:
+							house = (colorIndex * SPOTS_PER_HOUSE + targetIndex - firstHouseIndex - 1) % self._numHouses
+					housesForSpot.append(house)
+				housesForColor.append(housesForSpot)
+			self._houses.append(housesForColor)
+
+	@property
+	def colors(self) -> list[str]:
+		return self._colors
+
+	def target(self, spotIndex : int, distance : int) -> int:
+		return self._targets[spotIndex][distance - MIN_DISTANCE]
+
+	def house(self, colorIndex : int, spotIndex : int, distance : int) -> Optional[int]:
+		return self._houses[colorIndex][spotIndex][distance - MIN_DISTANCE]
+
+	def pathMask(self, spotIndex : int, distance : int) -> int:
+		if MIN_DISTANCE <= distance <= MAX_DISTANCE:
+			return self._pathMasks[spotIndex][distance - MIN_DISTANCE]
+		return self._makePathMask(spotIndex, distance)
+
+	def _makePathMask(self, spotIndex : int, distance : int) -> int:
+		if distance > 0:
+			start, length = spotIndex + 1, distance
+		else:
+			start, length = spotIndex + distance, -distance
+		bits = ((1 << min(length, self._numSpots)) - 1) << (start % self._numSpots)
+		# the bits past the last spot wrap around to the beginning of the board
+		return (bits | (bits >> self._numSpots)) & self._allSpotsMask
+
+	def housesBeforeMask(self, houseIndex : int) -> int:
+		return self._housesBeforeMasks[houseIndex]
+
+	def firstSpotIndexOfHouse(self, houseIndex : int) -> int:
+		return (houseIndex // SPOTS_PER_HOUSE) * SPOTS_PER_REGION
+
+	def targetsFrom(self, spotIndex : int) -> list[int]:
+		# Row of the target table for a given spot, to be indexed with (distance - MIN_DISTANCE) in tight loops.
+		return self._targets[spotIndex]
+
+	def housesFrom(self, colorIndex : int, spotIndex : int) -> list[Optional[int]]:
+		return self._houses[colorIndex][spotIndex]
+
+
+_geometries = {}
+
+def getGeometry(colors : list[str]) -> BoardGeometry:
+	key = tuple(colors)
+	geometry = _geometries.get(key)
+	if geometry is None:
+		geometry = BoardGeometry(colors)
+		_geometries[key] = geometry
+	return geometry
@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+from itertools import count
+
+from params import *
+
+
+# Every hand takes a new version number from this counter whenever it changes, so that a version identifies the content of
+# one hand at one point in time (and what has been computed from it can be cached under it)
+_versions = count()
+
 
 class Hand:
 	def __init__(self, player : Player, cards : list[Card] = None):
 		self._player = player
 		self._cards = cards
+		self._version = next(_versions)
 		if cards:
 			self._remainingCards = len(self._cards)
 
@@ -39,6 +49,10 @@ class Hand:
 	def cards(self) -> list[Card]:
 		return self._cards
 
+	@property
+	def version(self) -> int:
+		return self._version
+
 	def getCard(self, index : str) -> Card:
 		try:
 			return self._cards[int(index)]
@@ -53,19 +67,129 @@ class Hand:
 
 	def fold(self) -> None:
 		self._cards = []
+		self._version = next(_versions)
 
 	def discardFromHand(self, card) -> None:
 		del self._cards[self._cards.index(card)]
+		self._version = next(_versions)
 
 	def addToHand(self, card) -> None:
 		self._cards.append(card)
+		self._version = next(_versions)
 
 	def getAllPossibleMoves(self, board : Board) -> list[Move]:
-		allPossibleMoveOptions = []
-		for card in self._cards:
-			optionsFromThisCard = board.getMoveOptions(self._player, card)
-			for option in optionsFromThisCard:
-				allPossibleMoveOptions.append(option)
-		return allPossibleMoveOptions
+		if not self._cards:
+			return []
+		return board.getMoveOptionsForHand(self._player, self._cards)
+
+	def hasAnyPossibleMove(self, board : Board) -> bool:
+		if not self._cards:
+			return False
+		return board.hasAnyMoveOption(self._player, self._cards)
+
+
+# Bit i of a hand mask is set when the hand holds the card of index i (see Card.index)
+VALUE_MASKS = {value: ((1 << len(SUITS)) - 1) << (index * len(SUITS)) for index, value in enumerate(VALUES)}
+EXIT_MASK = VALUE_MASKS['A'] | VALUE_MASKS['K']
+
+_cardsInOrder = None
+
+
+def _getCardsInOrder() -> list[Card]:
+	# cards.py imports this module, hence the late import
+	global _cardsInOrder
+	if _cardsInOrder is None:
+		from cards import CARDS
+		_cardsInOrder = CARDS
+	return _cardsInOrder
+
+
+class BitHand:
+	# Same interface as Hand, but the cards are kept as a 52 bits mask: adding, removing or looking for a card is a bit
+	# operation, and copying a hand is copying an integer. The cards are listed in deck order (rather than in the order they
+	# were received), the list being rebuilt only after the hand has changed.
+	def __init__(self, player : Player, cards : list[Card] = None, mask : int = 0):
+		self._player = player
+		self._mask = mask
+		for card in cards or []:
+			self._mask |= 1 << card.index
+		self._cards = None
+		self._version = next(_versions)
+
+	def __str__(self) -> str:
+		if self._mask == 0:
+			return f'{self._player.name}\'s hand is empty'
+		return f'{self._player.name}\'s hand is composed of {self.size} cards: {self.allCardsString()}'
+
+	def __contains__(self, card : Card) -> bool:
+		return card.index >= 0 and (self._mask >> card.index) & 1 == 1
+
+	def allCardsString(self) -> str:
+		return ', '.join(str(card) for card in self.cards)
+
+	def copy(self) -> BitHand:
+		return BitHand(self._player, mask = self._mask)
+
+	@property
+	def mask(self) -> int:
+		return self._mask
 
+	@property
+	def size(self) -> int:
+		return self._mask.bit_count()
+
+	@property
+	def version(self) -> int:
+		return self._version
+
+	@property
+	def cards(self) -> list[Card]:
+		if self._cards is None:
+			allCards = _getCardsInOrder()
+			cards = []
+			mask = self._mask
+			while mask:
+				lowest = mask & -mask
+				cards.append(allCards[lowest.bit_length() - 1])
+				mask ^= lowest
+			self._cards = cards
+		return self._cards
+
+	def getCard(self, index : str) -> Card:
+		try:
+			return self.cards[int(index)]
+		except:
+			return None
 
+	def hasValue(self, value : str) -> bool:
+		return self._mask & VALUE_MASKS[value] != 0
+
+	def hasNoExitCard(self) -> bool:
+		return self._mask & EXIT_MASK == 0
+
+	def fold(self) -> None:
+		self._mask = 0
+		self._cards = None
+		self._version = next(_versions)
+
+	def discardFromHand(self, card) -> None:
+		if not card in self:
+			raise ValueError(f'{card} is not in the hand')
+		self._mask &= ~(1 << card.index)
+		self._cards = None
+		self._version = next(_versions)
+
+	def addToHand(self, card) -> None:
+		self._mask |= 1 << card.index
+		self._cards = None
+		self._version = next(_versions)
+
+	def getAllPossibleMoves(self, board : Board) -> list[Move]:
+		if self._mask == 0:
+			return []
+		return board.getMoveOptionsForHand(self._player, self.cards)
+
+	def hasAnyPossibleMove(self, board : Board) -> bool:
+		if self._mask == 0:
+			return False
+		return board.hasAnyMoveOption(self._player, self.cards)
@@ -0,0 +1,376 @@
+from __future__ import annotations
+from typing import Callable, Optional, Tuple
+
+import argparse
+import json
+import os
+import threading
+
+from board import Board
+from cards import Deck, CARDS
+from move import Move
+from seven import SevenSplit, ONE_STEP_CARD
+import engine
+
+from params import *
+
+# Every decision taken in a game (seating, hands dealt, card exchanges, moves, folds) is appended to the journal of the game,
+# one compact JSON line per entry, so that the game can be replayed entry by entry (to settle a dispute) or rebuilt after a
+# crash. Rebuilding does not go through the whole journal: the state of the table is saved every JOURNAL_SNAPSHOT_INTERVAL
+# entries, along with the position in the journal where the entries following it start, and only those are replayed.
+
+
+class JournalError(Exception):
+	pass
+
+
+class JournalWriter:
+	# Writes the journals of every game from a thread of its own, so that recording an entry only queues a line. The thread
+	# writes everything queued since its previous pass and syncs each file it has written to once, however many entries it
+	# got: the more games are played at once, the more entries share the same fsync.
+	def __init__(self, directory : str = JOURNAL_DIR):
+		self._directory = directory
+		self._pending = []
+		self._files = {}
+		self._condition = threading.Condition()
+		self._thread = None
+		self._closed = False
+		# number of entries written and not yet written (queued or being written)
+		self._written = 0
+		self._queued = 0
+		self.batches = 0
+		self.syncs = 0
+
+	def journalPath(self, gameId : str) -> str:
+		return os.path.join(self._directory, f'{gameId}.journal')
+
+	def snapshotPath(self, gameId : str) -> str:
+		return os.path.join(self._directory, f'{gameId}.snapshot')
+
+	def append(self, gameId : str, line : str) -> None:
+		self._put(('line', gameId, line))
+
+	def writeSnapshot(self, gameId : str, snapshot : dict) -> None:
+		self._put(('snapshot', gameId, snapshot))
+
+	def closeJournal(self, gameId : str) -> None:
+		# the file of a finished game is closed once everything queued for it is written
+		self._put(('close', gameId, None))
+
+	def _put(self, item : tuple) -> None:
+		with self._condition:
+			if self._closed:
+				raise JournalError('The journal writer is closed')
+			if self._thread is None:
+				os.makedirs(self._directory, exist_ok = True)
+				self._thread = threading.Thread(target = self._run, name = 'journal-writer', daemon = True)
+				self._thread.start()
+			self._pending.append(item)
+			self._queued += 1
+			self._condition.notify_all()
+
+	def flush(self) -> None:
+		# waits until everything queued so far is written and synced
+		with self._condition:
+			target = self._queued
+			self._condition.wait_for(lambda: self._written >= target)
+
+	def close(self) -> None:
+		with self._condition:
+			self._closed = True
+			self._condition.notify_all()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
+
+	def _run(self) -> None:
+		while True:
+			with self._condition:
+				self._condition.wait_for(lambda: self._pending or self._closed)
+				if not self._pending:
+					break
+				batch = self._pending
+				self._pending = []
+			try:
+				self._writeBatch(batch)
+			except Exception as e:
+				print(f'[JournalWriter] Error while writing {len(batch)} entries: {e}')
+			with self._condition:
+				self._written += len(batch)
+				self._condition.notify_all()
+		for file in self._files.values():
+			file.close()
+		self._files = {}
+
+	def _file(self, gameId : str):
+		file = self._files.get(gameId)
+		if file is None:
+			file = open(self.journalPath(gameId), 'ab')
+			self._files[gameId] = file
+		return file
+
+	def _sync(self, gameIds : set) -> None:
+		for gameId in gameIds:
+			file = self._files[gameId]
+			file.flush()
+			os.fsync(file.fileno())
+			self.syncs += 1
+		gameIds.clear()
+
+	def _writeBatch(self, batch : list) -> None:
+		self.batches += 1
+		unsynced = set()
+		for kind, gameId, data in batch:
+			if kind == 'line':
+				self._file(gameId).write(data.encode('utf-8') + b'\n')
+				unsynced.add(gameId)
+			elif kind == 'snapshot':
+				# the snapshot points at the end of the journal as it is on disk at this point
+				file = self._file(gameId)
+				self._sync(unsynced)
+				file.flush()
+				snapshot = dict(data, offset = file.tell())
+				path = self.snapshotPath(gameId)
+				with open(path + '.tmp', 'w', encoding = 'utf-8') as snapshotFile:
+					json.dump(snapshot, snapshotFile, separators = (',', ':'), ensure_ascii = False)
+					snapshotFile.flush()
+					os.fsync(snapshotFile.fileno())
+				os.replace(path + '.tmp', path)
+			elif kind == 'close':
+				if gameId in self._files:
+					self._sync({gameId} & unsynced)
+					unsynced.discard(gameId)
+					self._files.pop(gameId).close()
+		self._sync(unsynced)
+
+
+class GameJournal:
+	# The journal of one game: numbers the entries and hands them to the writer.
+	def __init__(self, gameId : str, writer : JournalWriter, seq : int = 0, snapshotInterval : int = JOURNAL_SNAPSHOT_INTERVAL):
+		# seq is the number of the last entry already in the journal, when a restored game goes on with it
+		self._gameId = gameId
+		self._writer = writer
+		self._snapshotInterval = snapshotInterval
+		self._seq = seq
+		self._sinceSnapshot = 0
+
+	@property
+	def seq(self) -> int:
+		return self._seq
+
+	@property
+	def isSnapshotDue(self) -> bool:
+		return self._sinceSnapshot >= self._snapshotInterval
+
+	def record(self, kind : str, **data) -> None:
+		self._seq += 1
+		self._sinceSnapshot += 1
+		self._writer.append(self._gameId, json.dumps({"n": self._seq, "k": kind, **data}, separators = (',', ':'), ensure_ascii = False))
+
+	def snapshot(self, snapshot : dict) -> None:
+		# snapshot is the state reached after the last entry recorded
+		self._sinceSnapshot = 0
+		self._writer.writeSnapshot(self._gameId, {"n": self._seq, **snapshot})
+
+	def close(self) -> None:
+		self._writer.closeJournal(self._gameId)
+
+
+def readEntries(path : str, offset : int = 0) -> list[dict]:
+	# entries of a journal from a byte offset on. A crash may have left the last line incomplete, it is then ignored.
+	entries = []
+	with open(path, 'rb') as file:
+		file.seek(offset)
+		for line in file:
+			try:
+				entries.append(json.loads(line))
+			except ValueError:
+				break
+	return entries
+
+
+def loadJournal(directory : str, gameId : str) -> Tuple[Optional[dict], list[dict]]:
+	# latest snapshot of a game (None if there is none) and the entries recorded after it
+	writer = JournalWriter(directory)
+	snapshot = None
+	if os.path.exists(writer.snapshotPath(gameId)):
+		with open(writer.snapshotPath(gameId), encoding = 'utf-8') as file:
+			snapshot = json.load(file)
+	entries = readEntries(writer.journalPath(gameId), snapshot['offset'] if snapshot else 0)
+	lastSeq = snapshot['n'] if snapshot else 0
+	return snapshot, [entry for entry in entries if entry['n'] > lastSeq]
+
+
+def playerRecord(player : Player) -> dict:
+	return {"id": player.id, "name": player.name, "team": player.team, "color": player.color}
+
+
+def moveRecord(move : Move, sevenSplit : SevenSplit = None) -> dict:
+	record = {"id": move.ID, "c": move.card.index, "o": str(move.originSpot) if move.originSpot else None, "t": str(move.targetSpot) if move.targetSpot else None}
+	if sevenSplit is not None:
+		record['s'] = [[str(step.originSpot), str(step.targetSpot)] for step in sevenSplit.moves]
+	return record
+
+
+def snapshotTable(state : engine.TableState) -> dict:
+	return {"colors": state.board.state.colors, "players": [playerRecord(player) for player in state.players], "board": state.board.getSnapshot(), "deck": state.deck.getSnapshot(), "hands": {player.name: [card.index for card in player.hand.cards or []] for player in state.players}, "active": state.activePlayerIndex, "handsFinished": state.handsFinished, "takenOver": sorted(state.takenOver), "finished": state.isFinished, "winners": [player.name for player in state.winners] if state.winners else None}
+
+
+def newTableFromRecord(start : dict, makePlayer : Callable) -> engine.TableState:
+	# table of a game as it was when its 'start' entry was recorded
+	players = [makePlayer(record) for record in start['players']]
+	players[0].setDealer()
+	state = engine.newTable(start['colors'], players, Deck(start['seed']))
+	return state
+
+
+def tableFromSnapshot(snapshot : dict, makePlayer : Callable) -> engine.TableState:
+	players = [makePlayer(record) for record in snapshot['players']]
+	players[0].setDealer()
+	playersByName = {player.name: player for player in players}
+	deck = Deck(snapshot['deck']['seed'])
+	deck.loadSnapshot(snapshot['deck'])
+	state = engine.newTable(snapshot['colors'], players, deck)
+	state.board.loadSnapshot(snapshot['board'], playersByName)
+	for player in players:
+		player.assignHand(state.handClass(player, [CARDS[index] for index in snapshot['hands'][player.name]]))
+	state.activePlayerIndex = snapshot['active']
+	state.handsFinished = snapshot['handsFinished']
+	state.takenOver = set(snapshot['takenOver'])
+	state.isFinished = snapshot['finished']
+	if snapshot['winners']:
+		state.winners = tuple(playersByName[name] for name in snapshot['winners'])
+	return state
+
+
+def _findSpot(board : Board, spotId : str) -> Spot:
+	spot = board.getSpotById(spotId) or board.getHouseById(spotId)
+	if spot is None:
+		raise JournalError(f'Unknown spot {spotId}')
+	return spot
+
+
+def _findMove(state : engine.TableState, record : dict) -> Tuple[Move, Optional[SevenSplit]]:
+	card = CARDS[record['c']]
+	for move in engine.legalMoves(state):
+		if move.ID == record['id'] and move.card is card and (str(move.originSpot) if move.originSpot else None) == record['o'] and (str(move.targetSpot) if move.targetSpot else None) == record['t']:
+			break
+	else:
+		raise JournalError(f'Move {record} is not possible for {state.activePlayer.name}')
+	sevenSplit = None
+	if 's' in record:
+		# the steps are played as recorded, only the spots they go through are needed
+		sevenSplit = SevenSplit([Move('MOVE', _findSpot(state.board, origin), _findSpot(state.board, target), ONE_STEP_CARD, move.player) for origin, target in record['s']], 0)
+	return move, sevenSplit
+
+
+def replayEntry(state : engine.TableState, entry : dict) -> list[dict]:
+	# applies one entry of the journal to the table and returns the events it gives
+	kind = entry['k']
+	events = []
+	if kind == 'round':
+		_, events = engine.startRound(state)
+	elif kind == 'deal':
+		player = next(player for player in state.players if player.name == entry['p'])
+		cards = [CARDS[index] for index in entry['cards']]
+		hand = state.deck.drawHand(len(cards), player, state.handClass)
+		if set(hand.cards) != set(cards):
+			raise JournalError(f'The deck deals {hand.cards} to {player.name} instead of {cards}')
+		player.assignHand(hand)
+	elif kind == 'exchange':
+		players = {player.name: player for player in state.players}
+		_, events = engine.exchangeCards(state, players[entry['p1']], CARDS[entry['c1']], players[entry['p2']], CARDS[entry['c2']])
+	elif kind == 'turn':
+		_, events = engine.startTurn(state)
+		if state.activePlayer.name != entry['p']:
+			raise JournalError(f'It is the turn of {state.activePlayer.name} instead of {entry["p"]}')
+		if 'm' in entry:
+			move, sevenSplit = _findMove(state, entry['m']) if entry['m'] else (None, None)
+			_, playEvents = engine.playMove(state, move, sevenSplit)
+			events += playEvents
+		_, endEvents = engine.endTurn(state)
+		events += endEvents
+	elif kind == 'reset':
+		state.deck.reset()
+	elif kind == 'dealer':
+		_, events = engine.nextDealer(state)
+	elif kind not in ['start', 'end']:
+		raise JournalError(f'Unknown journal entry {kind}')
+	return events
+
+
+def rebuildTable(snapshot : Optional[dict], entries : list[dict], makePlayer : Callable) -> Tuple[engine.TableState, dict]:
+	# table of a game from its latest snapshot (or its 'start' entry) and the entries following it, along with the game data
+	# which is not part of the table (round being played)
+	if snapshot is not None:
+		state = tableFromSnapshot(snapshot['table'], makePlayer)
+		game = {"round": snapshot['round']}
+	elif entries and entries[0]['k'] == 'start':
+		state = newTableFromRecord(entries[0], makePlayer)
+		game = {"round": -1}
+	else:
+		raise JournalError('The journal neither has a snapshot nor starts with a start entry')
+	for entry in entries:
+		if entry['k'] == 'round':
+			game['round'] = entry['i']
+		replayEntry(state, entry)
+	return state, game
+
+
+def describeEvent(event : dict) -> Optional[str]:
+	# text of an event of the engine, as the client shows it
+	kind = event['type']
+	if kind == 'turn':
+		return f'Next player: {event["turn"]} has folded in a previous turn, moving on...' if event.get('folded') else f'Moving on to next player: {event["turn"]}'
+	if kind == 'fold':
+		return f'{event["fold"]} has no available move and must fold.'
+	if kind == 'move':
+		moveId, origin, target, owner = event['move']
+		card = f'{event["card"][1]}{event["card"][0]}'
+		if moveId == 'OUT':
+			text = f'{event["by"]} plays {card} to take a piece out to {target}'
+		elif moveId == 'SWITCH':
+			text = f'{event["by"]} plays {card} to switch the pieces in {origin} and {target}'
+		elif moveId == 'SEVEN':
+			text = f'{event["by"]} plays {card} to split a seven: ' + ', '.join(f'{stepOrigin} -> {stepTarget}' for stepOrigin, stepTarget in event['steps'])
+		else:
+			text = f'{event["by"]} plays {card} to move {origin} -> {target}'
+		if owner != event['by']:
+			text += f' (pieces of {owner})'
+		if event.get('kicked'):
+			text += f', kicking {", ".join(event["kicked"])}'
+		return text
+	if kind == 'takeover':
+		return f'{event["takeover"]} has filled all houses and now plays with the pieces of his/her teammate.'
+	if kind == 'win':
+		return f'Players {" and ".join(event["winners"])} win!!!'
+	if kind == 'dealer':
+		return f'{event["dealer"]} is the dealer.'
+	return None
+
+
+def main(argv : list[str] = None) -> None:
+	from player import Player
+	parser = argparse.ArgumentParser(prog='toc-journal', description='Replay the journal of a game and print what happened.')
+	parser.add_argument('game_id')
+	parser.add_argument('--dir', default=JOURNAL_DIR, help='directory of the journals')
+	parser.add_argument('--from-snapshot', action='store_true', help='start from the latest snapshot rather than from the beginning')
+	args = parser.parse_args(argv)
+
+	writer = JournalWriter(args.dir)
+	if args.from_snapshot:
+		snapshot, entries = loadJournal(args.dir, args.game_id)
+	else:
+		snapshot, entries = None, readEntries(writer.journalPath(args.game_id))
+	makePlayer = lambda record: Player(record['id'], record['name'], record['team'], record['color'])
+	state, _ = rebuildTable(snapshot, [], makePlayer) if snapshot else rebuildTable(None, entries[:1], makePlayer)
+	for entry in (entries if snapshot else entries[1:]):
+		for event in replayEntry(state, entry):
+			text = describeEvent(event)
+			if text:
+				print(text)
+	print(state.board)
+
+
+if __name__ == '__main__':
+	main()
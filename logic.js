@@ -16,6 +16,12 @@ let local_game_Id = null;
 let local_player = null;
 let local_card_box = null;
 let local_info_box = null;
+// sequence number of the last delta applied to the board (null until the first full state is received)
+let local_seq = null;
+let resync_requested = false;
+// the deltas applied are acknowledged at most once every ACK_DELAY ms, with the sequence number of the last one
+const ACK_DELAY = 1000;
+let ack_timer = null;
 
 let stored_player_name = window.localStorage.getItem("session_player_name");
 let stored_game_id = window.localStorage.getItem("session_game_ID")
@@ -58,7 +64,10 @@ function clearError() {
 
 async function connectToGame(gameId, name, rejoin = false) {
   clearError();
-  const wsUrl = `wss://${window.location.host}/toc/ws/${gameId}/${name}`;
+  // when reconnecting to the game already displayed, only the deltas missed in the meantime need to be sent
+  const reconnecting = local_seq !== null && gameId === local_game_Id && name === local_player_name;
+  resync_requested = false;
+  const wsUrl = `wss://${window.location.host}/toc/ws/${gameId}/${name}` + (reconnecting ? `?seq=${local_seq}` : '');
   try {
     ws = new WebSocket(wsUrl);
   } catch (err) {
@@ -80,7 +89,10 @@ async function connectToGame(gameId, name, rejoin = false) {
       return;
     }
     console.log('[ws.oneMessage top handler] Received the following message from back-end:' + JSON.stringify(data))
+    handleMessage(data);
+  };
 
+  function handleMessage(data) {
     switch (data.type) {
       case 'ready':
         log(`Connected to game ${gameId} as ${name}`);
@@ -106,6 +118,12 @@ async function connectToGame(gameId, name, rejoin = false) {
           placePieceOnSpot(piece.playerId, piece.spotIndex);
         })
         displayActivePlayer(data.active_player);
+        local_seq = data.seq;
+        resync_requested = false;
+        break;
+
+      case 'delta':
+        applyDelta(data);
         break;
 
       case "draw":
@@ -122,10 +140,6 @@ async function connectToGame(gameId, name, rejoin = false) {
         }, 1500);
         break;
 
-      case "dealer":
-        toogleDealerOnPlayerBlock(data.playerId);
-        break;
-
       case "receive-card-from-friend":
         replaceCard(data.value, data.suit);
         break
@@ -134,11 +148,6 @@ async function connectToGame(gameId, name, rejoin = false) {
         placePieceOnSpot(data.playerId, data.spotIndex);
         break;
 
-      case 'fold':
-        foldAllCardsOfPlayer(data.playerId);
-        log(data.msg);
-        break;
-
       case 'log':
         log(data.msg);
         break;
@@ -147,21 +156,6 @@ async function connectToGame(gameId, name, rejoin = false) {
         log(data.msg);
         break;
 
-      case 'next-player':
-        displayActivePlayer(data.playerId);
-        log(data.msg);
-        break;
-
-      case 'play':
-        removeCard(data.playerId, data.value, data.suit);
-        if (data.value == 'J') {
-          switchPieces(data.playerId, data.origin, data.target);
-        } else {
-          movePieceFromSpotToSpot(data.playerId, data.origin, data.target);
-        }
-        log(data.msg);
-        break;
-
       case 'reject-card-selection':
         log(data.msg);
         showAllCardUp();
@@ -191,9 +185,84 @@ async function connectToGame(gameId, name, rejoin = false) {
         break;
 
       default:
-        log(`Unknown message: ${event.data}`);
+        log(`Unknown message: ${JSON.stringify(data)}`);
     }
-  };
+  }
+
+  function applyDelta(delta) {
+    if (local_seq !== null && delta.seq <= local_seq) {
+      // already applied
+      return;
+    }
+    if (local_seq === null || delta.seq > local_seq + 1) {
+      // some deltas were missed: the back-end sends them (or the full state) again, the following ones are ignored until then
+      if (!resync_requested) {
+        resync_requested = true;
+        ws.send(JSON.stringify({"id": crypto.randomUUID(), "type": "resync", "seq": local_seq === null ? -1 : local_seq}));
+      }
+      return;
+    }
+    applyChanges(delta);
+    local_seq = delta.seq;
+    resync_requested = false;
+    scheduleAck();
+  }
+
+  function scheduleAck() {
+    if (ack_timer !== null) {
+      return;
+    }
+    ack_timer = setTimeout(() => {
+      ack_timer = null;
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({"id": crypto.randomUUID(), "type": "ack", "seq": local_seq}));
+      }
+    }, ACK_DELAY);
+  }
+
+  function applyChanges(delta) {
+    // a delta only holds what changed (see engine.py), the text shown in the terminal is derived from it
+    if ('dealer' in delta) {
+      toogleDealerOnPlayerBlock(delta.dealer);
+    }
+    if ('turn' in delta) {
+      if (delta.folded) {
+        log(`Next player: ${delta.turn} has folded in a previous turn, moving on...`);
+      } else {
+        displayActivePlayer(delta.turn);
+        log(`Moving on to next player: ${delta.turn}`);
+      }
+    }
+    if ('fold' in delta) {
+      foldAllCardsOfPlayer(delta.fold);
+      log(`${delta.fold} has no available move and must fold.`);
+      log(`End of turn for player ${delta.fold}.`);
+    }
+    if ('move' in delta) {
+      const [kind, origin, target, owner] = delta.move;
+      const [value, suit] = delta.card;
+      removeCard(delta.by, value, suit);
+      if (delta.cardsLeft === 0) {
+        hideCardBlock(delta.by);
+      }
+      if (kind === 'SWITCH') {
+        switchPieces(owner, origin, target);
+      } else if (kind === 'SEVEN') {
+        delta.steps.forEach(([stepOrigin, stepTarget]) => movePieceFromSpotToSpot(owner, stepOrigin, stepTarget));
+      } else {
+        movePieceFromSpotToSpot(owner, origin, target);
+      }
+      log(describeMove(delta));
+      log(`End of turn for player ${delta.by}.`);
+    }
+    if ('takeover' in delta) {
+      log(`Player ${delta.takeover} has filled all houses!`);
+      log(`This player will now play using his/her teammate's pieces and attempt to win the game.`);
+    }
+    if ('winners' in delta) {
+      log(`Players ${delta.winners.join(' and ')} win!!!`);
+    }
+  }
   
   ws.onclose = (event) => {
 
@@ -204,6 +273,9 @@ async function connectToGame(gameId, name, rejoin = false) {
       case 4002:
         showError("Player name already taken.");
         break;
+      case 4004:
+        showError("This game has been closed.");
+        break;
       case 1006:
         showError("Could not connect to server.");
         break;
@@ -230,6 +302,11 @@ createBtn.addEventListener("click", async () => {
       method: "POST"
     });
     const data = await res.json();
+    if (!res.ok) {
+      // the server is full, the player may try again later
+      showError(data.error || "Failed to create game.");
+      return;
+    }
     const gameId = data.game_id;
     log(`Created game ID: ${gameId}`);
     await connectToGame(gameId, name);
@@ -393,6 +470,37 @@ function drawQuadrant(position, color) {
   spotElements.push(...quadrantSpots);
 }
 
+function describeMove(delta) {
+  const [kind, origin, target, owner] = delta.move;
+  const card = `${delta.card[1]}${delta.card[0]}`;
+  const kicked = delta.kicked ? ` and kick the piece of ${delta.kicked.join(', ')}` : '';
+  let description;
+  switch (kind) {
+    case 'OUT':
+      description = `take a piece out and place it in ${target}`;
+      break;
+    case 'MOVE':
+      description = `move piece currently in spot ${origin} to spot ${target}`;
+      break;
+    case 'BACK':
+      description = `move piece currently in spot ${origin} back to spot ${target}`;
+      break;
+    case 'ENTER':
+      description = `move piece currently in spot ${origin} to house spot ${target}`;
+      break;
+    case 'SWITCH':
+      description = `switch piece in spot ${origin} with the piece in spot ${target}`;
+      break;
+    case 'SEVEN':
+      description = `do a "seven split": ${delta.steps.map(([stepOrigin, stepTarget]) => `${stepOrigin} to ${stepTarget}`).join(', ')}`;
+      break;
+    default:
+      description = kind;
+  }
+  const pieces = owner !== delta.by ? ` (with the pieces of ${owner})` : '';
+  return `Player ${delta.by} plays ${card} to ${description}${kicked}${pieces}.`;
+}
+
 function placePieceOnSpot(playerId, targetSpot) {
   movePieceFromSpotToSpot(playerId, targetSpot, targetSpot);
 }
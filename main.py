@@ -1,13 +1,16 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
-from typing import Dict
+from fastapi.responses import JSONResponse
+from typing import Dict, List, Optional
+from collections import deque
 import asyncio
 import string
 import random
 import json
-from time import sleep
+import time
 
+from checkpoint import CheckpointStore
 from game import Game
+from journal import GameJournal, JournalWriter, tableFromSnapshot
 from player import Player
 from params import *
 
@@ -16,11 +19,127 @@ app = FastAPI()
 class DuplicateNameError(Exception):
     pass
 
+class TooManyGamesError(Exception):
+    pass
+
+class EncodedMessage:
+    # A message already serialized to JSON (the same way websocket.send_json would), which the output loops send as is: a
+    # broadcast is encoded once and the same text is queued for every player.
+    __slots__ = ('text', 'type')
+
+    def __init__(self, message: Dict):
+        self.text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        self.type = message.get('type')
+
+    def __str__(self) -> str:
+        return self.text
+
+# Returned by Outbox.get() in place of the messages dropped for a player who could not keep up: the output loop sends a
+# complete picture of the game instead (see GameSession.resync_messages)
+RESYNC = object()
+
+async def send_message(websocket: WebSocket, message):
+    if isinstance(message, EncodedMessage):
+        await websocket.send_text(message.text)
+    else:
+        await websocket.send_json(message)
+
+def message_type(message) -> str:
+    if isinstance(message, EncodedMessage):
+        return message.type
+    if isinstance(message, dict):
+        return message.get('type')
+    return None
+
+class Outbox:
+    # Bounded queue of the messages waiting to be sent to one connection. When it overflows, the messages which a later one
+    # makes redundant (logs, all but the last full UI state) are dropped first. Deltas are never dropped one by one, since
+    # the client would have to ask for the missing ones anyway. If that is not enough, everything is dropped and the
+    # connection is marked for a resync (which sends the missed deltas and the pending prompts again), so that a stalled
+    # client never costs more than maxsize messages.
+    def __init__(self, maxsize: int = OUTBOX_SIZE):
+        self.messages = deque()
+        self.maxsize = maxsize
+        self.needs_resync = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def put(self, message):
+        self.messages.append(message)
+        if len(self.messages) > self.maxsize:
+            self._coalesce()
+        if len(self.messages) > self.maxsize:
+            self._drop_for_resync()
+        self._ready.set()
+
+    def _coalesce(self):
+        lastState = None
+        for message in self.messages:
+            if message_type(message) == 'full-ui-state':
+                lastState = message
+        kept = deque(message for message in self.messages if message_type(message) not in ['log', 'full-ui-state'] or message is lastState)
+        self.dropped += len(self.messages) - len(kept)
+        self.messages = kept
+
+    def _drop_for_resync(self):
+        # the prompts the game is waiting an answer for are not lost: the resync sends them again (see resync_messages)
+        self.dropped += len(self.messages)
+        self.messages.clear()
+        self.needs_resync = True
+
+    def clear(self):
+        self.dropped += len(self.messages)
+        self.messages.clear()
+        self.needs_resync = False
+
+    async def get(self):
+        while not self.messages and not self.needs_resync:
+            self._ready.clear()
+            await self._ready.wait()
+        if self.needs_resync:
+            self.needs_resync = False
+            return RESYNC
+        return self.messages.popleft()
+
+class DeltaLog:
+    # The changes made to the game, numbered in sequence: every call to append() makes a delta message carrying the next
+    # sequence number. The last `window` deltas are kept so that a client who has missed some of them gets exactly those,
+    # only a client further behind needs a full snapshot.
+    def __init__(self, window: int = DELTA_WINDOW):
+        self.seq = 0
+        self.deltas = deque(maxlen=window)
+
+    def append(self, events: List[Dict]) -> EncodedMessage:
+        # a delta is flat: the fields of the events of one step of the engine (see engine.py), e.g.
+        # {"type": "delta", "seq": 12, "by": "bob", "card": ["5", "♠️"], "move": ["MOVE", "spot-red-3", "spot-red-8", "bob"], "cardsLeft": 3}
+        self.seq += 1
+        delta = {"type": "delta", "seq": self.seq}
+        for event in events:
+            delta.update((key, value) for key, value in event.items() if key != 'type')
+        delta = EncodedMessage(delta)
+        self.deltas.append(delta)
+        return delta
+
+    def since(self, seq: int) -> Optional[List[EncodedMessage]]:
+        # the deltas following seq, or None when some of them are not retained anymore
+        if seq == self.seq:
+            return []
+        missing = self.seq - seq
+        # a client ahead of the log has seen the deltas of another run of the game
+        if seq < 0 or missing < 0 or missing > len(self.deltas):
+            return None
+        return list(self.deltas)[-missing:]
+
 class PlayerInputRouter:
     def __init__(self):
         self.input_queues = {}
         self.output_queues = {}
         self.recycleBin = {}
+        # the queries sent to each player which are still waiting for an answer, to be sent again when he/she reconnects
+        self.pending_prompts: Dict[str, List] = {}
 
     def register(self, player_name: str):
         if player_name in self.input_queues:
@@ -29,16 +148,23 @@ class PlayerInputRouter:
         else:
             print(f'[Router] Registered user {player_name}')
             self.input_queues[player_name] = asyncio.Queue()
-            self.output_queues[player_name] = asyncio.Queue()
+            self.output_queues[player_name] = Outbox()
 
     def registerAgain(self, player_name: str):
         print(f'[Router] Reregistering user {player_name}')
         self.input_queues[player_name] = self.recycleBin[player_name]['in']
         self.output_queues[player_name] = self.recycleBin[player_name]['out']
 
+    def register_inactive(self, player_name: str):
+        # a player of a restored game, whose queues are waiting for him/her to reconnect (see registerAgain)
+        self.recycleBin[player_name] = {'in': asyncio.Queue(), 'out': Outbox()}
+
     def unregister(self, player_name: str):
         print(f'[Router] Unregistered user {player_name}')
         self.recycleBin[player_name] = {'in': self.input_queues.pop(player_name, None), 'out': self.output_queues.pop(player_name, None)}
+        # the player is sent the whole state of the game when rejoining, nothing needs to be kept until then
+        if self.recycleBin[player_name]['out']:
+            self.recycleBin[player_name]['out'].clear()
 
     async def add_input(self, player_name: str, message: str):
         print(f"[Router] add_input called for {player_name}: {message}")
@@ -49,52 +175,190 @@ class PlayerInputRouter:
             print(f"[Router] No input queue found for {player_name}")
 
     async def wait_for_input(self, player_name: str):
-        msg = await self.input_queues[player_name].get()
+        # a disconnected player is waited for on the queue he/she will get back when reconnecting
+        queue = self.input_queues.get(player_name) or self.recycleBin[player_name]['in']
+        msg = await queue.get()
+        self.pending_prompts.pop(player_name, None)
         print(f"[Router] wait_for_input received {msg} of type {type(msg)}")
         return msg
 
     async def send_output(self, player_name: str, message: str):
         print(f"[Router] send_output called for {player_name}: {message}")
-        queue = self.output_queues.get(player_name)
-        if queue:
-            await queue.put(message)
+        if (message_type(message) or '').startswith('query'):
+            self.pending_prompts.setdefault(player_name, []).append(message)
+        outbox = self.output_queues.get(player_name)
+        if outbox is not None:
+            outbox.put(message)
         else:
             print(f"[Router] No output queue found for {player_name}")
 
+    def release(self):
+        # drops the queues of every player, connected or not
+        for outbox in list(self.output_queues.values()) + [queues['out'] for queues in self.recycleBin.values() if queues['out']]:
+            outbox.clear()
+        self.input_queues.clear()
+        self.output_queues.clear()
+        self.recycleBin.clear()
+        self.pending_prompts.clear()
+
+    def resend_pending_prompts(self, player_name: str):
+        outbox = self.output_queues.get(player_name)
+        if outbox is not None:
+            for prompt in self.pending_prompts.get(player_name, []):
+                outbox.put(prompt)
+
     async def get_output(self, player_name: str):
         return await self.output_queues[player_name].get()
 
 
+class Connection:
+    # One websocket of a player along with the tasks serving it (input, output and UI loops) and its UI outbox. Everything is
+    # torn down by close(), when the player disconnects or connects again from somewhere else, so that nothing outlives it.
+    def __init__(self, gameSession, player_id: str, websocket: WebSocket):
+        self.gameSession = gameSession
+        self.player_id = player_id
+        self.websocket = websocket
+        self.ui_queue = Outbox()
+        self.tasks = set()
+        self.closed = False
+        gameSession.ui_queues.append(self.ui_queue)
+
+    def start(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            print(f'[Connection] Task of {self.player_id} failed: {task.exception()}')
+
+    async def close(self, code: int = 1000):
+        if self.closed:
+            return
+        self.closed = True
+        # close() may be called from one of the tasks, which then simply ends on its own
+        current = asyncio.current_task()
+        tasks = [task for task in self.tasks if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.ui_queue in self.gameSession.ui_queues:
+            self.gameSession.ui_queues.remove(self.ui_queue)
+        if self.gameSession.connections.get(self.player_id) is self:
+            del self.gameSession.connections[self.player_id]
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # already closed by the client
+            pass
+
 class ConnectionManager:
-    def __init__(self):
+    # Only an index of the games: everything a game needs (players, message queues, start synchronization) lives in its
+    # GameSession, so that games never share a lock, a queue or a condition. The games saved when the server last stopped
+    # are only restored when one of their players reconnects.
+    def __init__(self, checkpoints: CheckpointStore):
         self.games: Dict[str, GameSession] = {}
+        self.checkpoints = checkpoints
+        self.restoring: Dict[str, asyncio.Task] = {}
+        self.reaper_task = None
 
     def _generate_game_id(self, length=4):
         charset = string.ascii_uppercase + string.digits
         while True:
             game_id = ''.join(random.choices(charset, k=length))
-            if game_id not in self.games:
+            if game_id not in self.games and not self.checkpoints.contains(game_id):
                 return game_id
 
-    def create_game(self, msg_router) -> str:
+    def create_game(self) -> str:
+        if len(self.games) >= MAX_GAMES:
+            raise TooManyGamesError
         game_id = self._generate_game_id()
-        self.games[game_id] = GameSession(game_id, msg_router)
+        self.games[game_id] = GameSession(game_id)
         return game_id
 
     def get_game(self, game_id: str):
         return self.games.get(game_id)
 
+    async def load_game(self, game_id: str):
+        # the game in memory, or the saved one restored (players connecting at the same time share the same restoration)
+        gameSession = self.games.get(game_id)
+        if gameSession is not None:
+            return gameSession
+        if game_id not in self.restoring:
+            self.restoring[game_id] = asyncio.create_task(self._restore_game(game_id))
+        return await asyncio.shield(self.restoring[game_id])
+
+    async def _restore_game(self, game_id: str):
+        try:
+            data = await asyncio.to_thread(self.checkpoints.load, game_id)
+            if data is None:
+                return None
+            gameSession = GameSession(game_id)
+            gameSession.restore(data)
+            self.games[game_id] = gameSession
+            # the game lives in memory again, it is saved anew at the next shutdown
+            await asyncio.to_thread(self.checkpoints.delete, game_id)
+            print(f'[ConnectionManager] Restored game {game_id}')
+            return gameSession
+        finally:
+            self.restoring.pop(game_id, None)
+
+    async def reap(self) -> List[str]:
+        # evicts the games which are finished, were never filled or are idle, releasing everything they hold
+        now = time.monotonic()
+        evicted = []
+        for game_id, gameSession in list(self.games.items()):
+            reason = gameSession.reason_to_evict(now)
+            if reason:
+                print(f'[Reaper] Evicting game {game_id}: {reason}')
+                del self.games[game_id]
+                await gameSession.close()
+                evicted.append(game_id)
+        return evicted
+
+    async def run_reaper(self):
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL)
+            try:
+                await self.reap()
+            except Exception as e:
+                print(f'[Reaper] Error: {e}')
+
+    def checkpoint_all(self) -> Dict[str, Dict]:
+        return {game_id: gameSession.checkpoint() for game_id, gameSession in self.games.items() if not (gameSession.game and gameSession.game.isFinished)}
+
 class GameSession:
-    def __init__(self, game_id: str, msg_router):
+    def __init__(self, game_id: str):
         self.id = game_id
         self.players: Dict = {}
         self.started = False
         self.lock = asyncio.Lock()
         self.remaining_colors = COLORS
-        self.router = msg_router
+        # each game routes the messages of its own players, and waits for its own order to be set
+        self.router = PlayerInputRouter()
+        self.orderIsSet_condition = asyncio.Condition()
         self.ui_queues: List = []
+        self.connections: Dict[str, Connection] = {}
         self.order: List = []
         self.game = None
+        self.game_task = None
+        # to find the lobbies which never filled up and the games nobody plays anymore
+        self.created_at = time.monotonic()
+        self.last_activity = self.created_at
+        # changes made by the game, sent as numbered deltas, and the last one applied by each player
+        self.deltas = DeltaLog()
+        self.acked: Dict[str, int] = {}
+        # encoded once and sent as is to every player (re)connecting until the state changes: the full UI state tagged with
+        # the version it was built for, and the hand of each player tagged with the version of the hand
+        self.setup_version = 0
+        self.snapshot_cache = None
+        self.hand_cache: Dict[str, tuple] = {}
+        self.snapshot_hits = 0
+        self.snapshot_rebuilds = 0
+        self.hand_hits = 0
+        self.hand_rebuilds = 0
 
     def fullUI(self) -> dict:
         if self.game:
@@ -103,10 +367,128 @@ class GameSession:
             else:
                 active_player_name = ""
 
-            return {"type": "full-ui-state", "players": [{"name": self.players[p]["name"], "team": self.players[p]["team"], "color": self.players[p]["color"], "number_of_cards": self.players[p]["object"].hand.size} for p in self.players], "pieces": self.game.board.getAllPiecesOnTheBoard(), "active_player": active_player_name}
+            return {"type": "full-ui-state", "players": [{"name": self.players[p]["name"], "team": self.players[p]["team"], "color": self.players[p]["color"], "number_of_cards": self.players[p]["object"].hand.size} for p in self.players], "pieces": self.game.board.getAllPiecesOnTheBoard(), "active_player": active_player_name, "seq": self.deltas.seq}
         else:
-            return {"type": "full-ui-state", "players": [{"name": self.players[p]["name"], "team": self.players[p]["team"], "color": self.players[p]["color"], "number_of_cards": self.players[p]["object"].hand.size} for p in self.players], "pieces": [], "active_player": ""}
+            return {"type": "full-ui-state", "players": [{"name": self.players[p]["name"], "team": self.players[p]["team"], "color": self.players[p]["color"], "number_of_cards": self.players[p]["object"].hand.size} for p in self.players], "pieces": [], "active_player": "", "seq": self.deltas.seq}
+
+
+    def catch_up_messages(self, seq: int) -> List:
+        # what a player who has applied the deltas up to seq needs to get up to date: the deltas he/she has missed, or the
+        # whole board when they are not retained anymore
+        deltas = self.deltas.since(seq)
+        if deltas is None:
+            return [self.snapshot()]
+        return deltas
+
+    def invalidate_setup(self):
+        # to be called when the players, their team or their color change
+        self.setup_version += 1
+
+    def state_version(self) -> tuple:
+        # the board only changes through deltas, the hands are versioned on their own
+        return (self.setup_version, self.deltas.seq, self.game is not None) + tuple(self.players[p]['object'].hand.version for p in self.players)
+
+    def snapshot(self) -> EncodedMessage:
+        version = self.state_version()
+        if self.snapshot_cache is not None and self.snapshot_cache[0] == version:
+            self.snapshot_hits += 1
+            return self.snapshot_cache[1]
+        self.snapshot_rebuilds += 1
+        snapshot = EncodedMessage(self.fullUI())
+        self.snapshot_cache = (version, snapshot)
+        return snapshot
+
+    def hand_message(self, player_id: str) -> EncodedMessage:
+        hand = self.players[player_id]['object'].hand
+        cached = self.hand_cache.get(player_id)
+        if cached is not None and cached[0] == hand.version:
+            self.hand_hits += 1
+            return cached[1]
+        self.hand_rebuilds += 1
+        message = EncodedMessage(self.players[player_id]['object'].handMessage())
+        self.hand_cache[player_id] = (hand.version, message)
+        return message
+
+    def resync_messages(self, player_id: str) -> List:
+        # what a player who has missed messages needs to get back in sync: the deltas since the last one he/she acknowledged,
+        # his/her hand, and the whole prompt the game is waiting for him/her to answer (options included)
+        return self.catch_up_messages(self.acked.get(player_id, -1)) + [self.hand_message(player_id)] + self.router.pending_prompts.get(player_id, [])
+
+    def acknowledge(self, player_id: str, seq: int):
+        if seq <= self.deltas.seq:
+            self.acked[player_id] = max(seq, self.acked.get(player_id, -1))
+
+    def checkpoint(self) -> Dict:
+        # everything needed to bring the game back after a restart (see restore()), a turn in progress being played again. Players
+        # who have not chosen their color yet are left out, they will simply join again.
+        players = [{"id": p['id'], "name": p['name'], "team": p['team'], "color": p['color']} for p in self.players.values() if p['color']]
+        return {"players": players, "order": self.order, "started": self.started, "seq": self.deltas.seq, "game": self.game.snapshot() if self.game else None, "journal_seq": self.game.journal.seq if self.game and self.game.journal else 0}
+
+    def restore(self, data: Dict):
+        # every player is disconnected until he/she reconnects, the game itself goes on (and waits for them) right away
+        for record in data['players']:
+            player = Player(record['id'], record['name'], record['team'], record['color'], '', self, self.router)
+            self.players[record['id']] = {"name": record['name'], "id": record['id'], "websocket": None, "team": record['team'], "color": record['color'], "object": player, "active": False}
+            self.router.register_inactive(record['id'])
+        self.remaining_colors = [color for color in COLORS if color not in [record['color'] for record in data['players']]]
+        self.order = data['order']
+        self.started = data['started']
+        self.deltas.seq = data['seq']
+        if data['game']:
+            snapshot = data['game']
+            state = tableFromSnapshot(snapshot['table'], lambda record: self.players[record['id']]['object'])
+            self.game = Game(self, snapshot['table']['colors'], journal=GameJournal(self.id, journal_writer, data['journal_seq']), state=state)
+            self.game.setPlayers(state.players)
+            self.game.restore(snapshot)
+            self.game_task = asyncio.create_task(self.resume_game())
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def reason_to_evict(self, now: float) -> Optional[str]:
+        if self.game is not None and self.game.isFinished:
+            return 'finished'
+        if not self.started and now - self.created_at > LOBBY_TTL:
+            return 'never filled'
+        if now - self.last_activity > IDLE_TIMEOUT:
+            return 'idle'
+        return None
+
+    async def close(self):
+        # stops the game and closes the connections of its players (who are told that the game is closed), then drops the queues
+        if self.game_task is not None:
+            self.game_task.cancel()
+            await asyncio.gather(self.game_task, return_exceptions=True)
+        for connection in list(self.connections.values()):
+            await connection.close(code=4004)
+        self.connections.clear()
+        self.ui_queues.clear()
+        self.router.release()
+        if self.game is not None and self.game.journal is not None and not self.game.isFinished:
+            self.game.journal.close()
+
+    async def run_game(self):
+        # the game runs in a task of its own, so that it can be stopped when the game is evicted
+        if self.game_task is not None:
+            return
+        self.game_task = asyncio.create_task(self.game_loop())
+        try:
+            # shielded, so that only close() stops the game, not the connection waiting for it
+            await asyncio.shield(self.game_task)
+        except asyncio.CancelledError:
+            # the game has been stopped by close(): the connection waiting for it was not cancelled itself and goes on
+            if not self.game_task.cancelled():
+                raise
+
+    async def resume_game(self):
+        async with self.lock:
+            print(f'[GameSession] Resuming game {self.id}')
+            await self.game.play()
 
+    def counters(self) -> Dict:
+        # live resources of the game, to make sure nothing leaks as players come and go
+        outboxes = list(self.router.output_queues.values()) + self.ui_queues
+        return {"connections": len(self.connections), "tasks": sum(len(connection.tasks) for connection in self.connections.values()), "input_queues": len(self.router.input_queues), "output_queues": len(self.router.output_queues), "ui_queues": len(self.ui_queues), "queued_messages": sum(len(outbox) for outbox in outboxes), "dropped_messages": sum(outbox.dropped for outbox in outboxes), "snapshot_hits": self.snapshot_hits, "snapshot_rebuilds": self.snapshot_rebuilds, "hand_hits": self.hand_hits, "hand_rebuilds": self.hand_rebuilds}
 
     def team_is_full(self, team: str) -> bool:
         return sum([self.players[p]['team'] == team for p in self.players.keys()]) == 2
@@ -114,11 +496,14 @@ class GameSession:
     def getFullPlayerId(self, game_id : str, player_name : str) -> str:
         return f'{game_id}-{player_name}'
 
-    async def broadcast(self, message: Dict, excluded_player : str = None):
-        for player_id in self.players.keys():
-            if player_id != excluded_player:
-                player = self.players[player_id]['object']
-                await player.send_message_to_user(message)
+    async def broadcast(self, message, excluded_player : str = None):
+        # private messages (hands, queries...) are encoded for their recipient by the output loop, broadcasts only once here
+        encoded = message if isinstance(message, EncodedMessage) else EncodedMessage(message)
+        await asyncio.gather(*[self.router.send_output(player_id, encoded) for player_id in self.players.keys() if player_id != excluded_player])
+
+    async def publish(self, events: List[Dict]):
+        # changes to the game are broadcast as a single delta
+        await self.broadcast(self.deltas.append(events))
 
     async def game_loop(self):
         async with self.lock:
@@ -126,7 +511,7 @@ class GameSession:
                 return
             self.started = True
             await self.broadcast({"type": "log", "msg": "Four players have joined: game is starting!\n"})
-            self.game = Game(self, [self.players[player_id]['color'] for player_id in self.order])
+            self.game = Game(self, [self.players[player_id]['color'] for player_id in self.order], journal=GameJournal(self.id, journal_writer))
             # players are set in the order defined by the array passed by the UI
             self.game.setPlayers([self.players[player_id]['object'] for player_id in self.order])
             await self.game.start()
@@ -152,7 +537,7 @@ class GameSession:
 @app.websocket("/toc/ws/{game_id}/{player_name}")
 async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: str):
 
-    gameSession = manager.games.get(game_id)    
+    gameSession = await manager.load_game(game_id)
     # Setting up all the WebSocket and asyncio logic 
     await websocket.accept()
 
@@ -160,6 +545,7 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
         print('Closing with 4001 code')
         await websocket.close(code=4001)
         return
+    router = gameSession.router
 
     player_id = gameSession.getFullPlayerId(game_id, player_name)
 
@@ -183,11 +569,20 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
 
     await websocket.send_json({"type": "ready"})
 
+    # a player connecting again while the previous connection is still open replaces it
+    previous_connection = gameSession.connections.get(player_id)
+    connection = Connection(gameSession, player_id, websocket)
+    gameSession.connections[player_id] = connection
+    gameSession.touch()
+    if previous_connection:
+        await previous_connection.close()
+
     ## Player input loop
     async def input_loop():
         try:
             while True:
                 data = await websocket.receive_text()
+                gameSession.touch()
                 #print(f"[input_loop] Raw message: {data}")  # Log raw message
                 try:
                     # Parse the JSON string into a Python dictionary
@@ -214,39 +609,58 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
                             # We're dealing with the special message at the end of the game setup phase where the front-end of player 4 is giving the back-end the order in which the players have decided to play. This data is used to update the order in which items are in the game.players array.
                         if len(gameSession.order) == 0: # we only need to update the game.order once, and we don't want this check to be mutualized with the parsed_data type check otherwise multiple msg will reach the router and this will break the card exchange process which comes after
                             gameSession.order = [gameSession.getFullPlayerId(gameSession.id, player_name_from_UI) for player_name_from_UI in parsed_data['order']]
-                            await try_notify_order_ready(gameSession, orderIsSet_condition)
+                            await try_notify_order_ready(gameSession)
+                    elif parsed_data['type'] == 'ack':
+                        gameSession.acknowledge(player_id, int(parsed_data['seq']))
+                    elif parsed_data['type'] == 'resync':
+                        # the client has noticed a gap in the sequence of deltas
+                        for message in gameSession.catch_up_messages(int(parsed_data['seq'])):
+                            await router.send_output(player_id, message)
                     else:
                         await router.add_input(player_id, parsed_data)
                 except json.JSONDecodeError as e:
                     print(f"Error decoding JSON, passing it as raw text just in case: {e}")
                     await router.add_input(player_id, data)
         except WebSocketDisconnect:
-            gameSession.players[player_id]['active'] = False
-            router.unregister(player_id)
-            await gameSession.broadcast({"type": "log", "msg": f"{player_id} disconnected."}, excluded_player=player_id)
+            pass
         except Exception as e:
             print(f"[input_loop] Error: {e}")
 
-    asyncio.create_task(input_loop())
+        # the connection is lost (when it is closed on purpose, this task is cancelled and does not get here)
+        if gameSession.connections.get(player_id) is connection:
+            if player_id in gameSession.players:
+                gameSession.players[player_id]['active'] = False
+            router.unregister(player_id)
+            await connection.close()
+            await gameSession.broadcast({"type": "log", "msg": f"{player_id} disconnected."}, excluded_player=player_id)
+        else:
+            await connection.close()
+
+    connection.start(input_loop())
 
     ## Player output loop
     async def output_loop():
         while True:
             message = await router.get_output(player_id)
-            await websocket.send_json(message)
+            if message is RESYNC:
+                print(f'[output loop] {player_id} could not keep up, sending the whole state of the game again')
+                for resync_message in gameSession.resync_messages(player_id):
+                    await send_message(websocket, resync_message)
+            else:
+                await send_message(websocket, message)
 
-    asyncio.create_task(output_loop())
+    connection.start(output_loop())
 
     ## IO output loop
-    async def send_updates(websocket: WebSocket, queue: asyncio.Queue):
+    async def send_updates(websocket: WebSocket, outbox: Outbox):
         while True:
-            update = await queue.get()
-            await websocket.send_json(update)
-
-    ui_queue = asyncio.Queue()
-    gameSession.ui_queues.append(ui_queue)
+            update = await outbox.get()
+            if update is RESYNC:
+                await send_message(websocket, gameSession.snapshot())
+            else:
+                await send_message(websocket, update)
 
-    sender = asyncio.create_task(send_updates(websocket, ui_queue))
+    connection.start(send_updates(websocket, connection.ui_queue))
 
     # Finalizing game setup for each player connecting
     
@@ -254,7 +668,7 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
     if not existing_player:
         ## First creating the new_player object and updating the new player's UI with current state of the board
         new_player = Player(player_id, player_name, '', '', '', gameSession, router)
-        await new_player.send_message_to_user(gameSession.fullUI())
+        await new_player.send_message_to_user(gameSession.snapshot())
         
         ## Only then we create the new player object and add it to the collection (since it will be without color or team for now, if we send it before the UI broadcast the front-end will get confused)
         gameSession.players[player_id] = {
@@ -266,6 +680,7 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
             "object": new_player,
             "active": True
         }
+        gameSession.invalidate_setup()
 
         ## Figuring out and/or asking the player for team and color selection
         if len(gameSession.players) == 1:
@@ -303,6 +718,7 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
         gameSession.players[player_id]['team'] = team
         gameSession.players[player_id]['object'].setTeam(team)
         gameSession.players[player_id]['active'] = True
+        gameSession.invalidate_setup()
 
 
         ## Broadcasting the join-info to new player, the UIs and the other players
@@ -311,39 +727,73 @@ async def websocket_endpoint(websocket: WebSocket, game_id: str, player_name: st
         await gameSession.broadcast({"type": "assign-player", "name": player_name, "team": team, "color": color})
 
     else:
-        # and we're also checking if this is not a disconnect player who is coming back!
-        if not existing_player['active']:
-            existing_player['websocket'] = websocket
-            existing_player['active'] = True
-            await existing_player['object'].send_message_to_user(gameSession.fullUI())
-            await existing_player['object'].send_message_to_user({"type": "log", "msg": f"You successfully rejoined the game in team {existing_player['team']} with color {existing_player['color']}!\n"})
-            await existing_player['object'].sendHandAgain()
+        # and we're also checking if this is not a disconnect player who is coming back! A player connecting again while the
+        # previous connection is still open (replaced above) is caught up the same way.
+        rejoining = not existing_player['active']
+        existing_player['websocket'] = websocket
+        existing_player['active'] = True
+        if not rejoining:
+            # what was queued for the previous connection is covered by the catch-up below
+            router.output_queues[player_id].clear()
+        # a client that still shows the game only needs the deltas it has missed since it was disconnected
+        seq = websocket.query_params.get('seq')
+        for message in gameSession.catch_up_messages(int(seq) if seq and seq.lstrip('-').isdigit() else -1):
+            await existing_player['object'].send_message_to_user(message)
+        await existing_player['object'].send_message_to_user({"type": "log", "msg": f"You successfully rejoined the game in team {existing_player['team']} with color {existing_player['color']}!\n"})
+        if gameSession.game is not None:
+            await existing_player['object'].send_message_to_user(gameSession.hand_message(player_id))
+        # and what the game is waiting for him/her to answer
+        router.resend_pending_prompts(player_id)
+        if rejoining:
             await gameSession.broadcast({"type": "log", "msg": f"{player_id} has rejoined team {existing_player['team']} and plays {existing_player['color']}.\n"}, excluded_player=player_id)
 
     ## When we have 4 players, the game can start if the game.order variable has been set!
     if len(gameSession.players) == 4:
         ## We wait for the lock on the game.order to be lifted because this ws message will (most likely) come later than the check on len(game.players)
-        async with orderIsSet_condition:
-            await orderIsSet_condition.wait_for(lambda: len(gameSession.order) == 4)
-        await gameSession.game_loop()
-
-
-router = PlayerInputRouter()
-manager = ConnectionManager()
-orderIsSet_condition = asyncio.Condition()
-
-# Helper function for the lock on game.order at the beginning of the game
-async def try_notify_order_ready(gameSession, condition):
-    async with condition:
+        async with gameSession.orderIsSet_condition:
+            await gameSession.orderIsSet_condition.wait_for(lambda: len(gameSession.order) == 4)
+        await gameSession.run_game()
+
+
+manager = ConnectionManager(CheckpointStore())
+# the journals of all the games are written by a single thread, see journal.py
+journal_writer = JournalWriter()
+
+@app.on_event("startup")
+async def start_reaper():
+    manager.reaper_task = asyncio.create_task(manager.run_reaper())
+
+@app.on_event("shutdown")
+async def save_games():
+    # the games in progress are saved to be restored when their players reconnect, and everything recorded so far in their
+    # journals is written before the process exits
+    checkpoints = manager.checkpoint_all()
+    await asyncio.to_thread(manager.checkpoints.saveAll, checkpoints)
+    print(f'[Shutdown] Saved {len(checkpoints)} games')
+    await asyncio.to_thread(journal_writer.close)
+    manager.checkpoints.close()
+
+# Helper function for the lock on game.order at the beginning of the game, only the players of that game are woken up
+async def try_notify_order_ready(gameSession):
+    async with gameSession.orderIsSet_condition:
         if len(gameSession.order) == 4:
-            condition.notify_all()
+            gameSession.orderIsSet_condition.notify_all()
 
 @app.get("/toc")
 async def root():
     return {"message": "Game backend is running."}
 
 
+@app.get("/toc/api/stats")
+async def stats():
+    return {game_id: gameSession.counters() for game_id, gameSession in manager.games.items()}
+
+
 @app.post("/toc/api/create-game")
 async def create_game():
-    game_id = manager.create_game(router)
+    try:
+        game_id = manager.create_game()
+    except TooManyGamesError:
+        # the client may try again once the reaper has evicted some games
+        return JSONResponse(status_code=503, content={"error": "Too many games are being played, please try again in a few minutes.", "retry_after": REAPER_INTERVAL}, headers={"Retry-After": str(REAPER_INTERVAL)})
     return {"game_id": game_id}
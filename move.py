@@ -7,14 +7,17 @@ from params import *
 
 
 class Move:
+	# Moves are generated in large numbers (every card of every hand on every turn, seven splits, bots, simulations), so they
+	# are kept as small fixed records: the human-readable description is only rendered when it is asked for, i.e. when a
+	# message about the move is actually sent.
+	__slots__ = ('_ID', '_originSpot', '_targetSpot', '_card', '_player')
+
 	def __init__(self, ID : str, originSpot : Spot = None, targetSpot : Spot = None, card : Card = None, player : Player = None):
 		self._ID = ID
-		self._description = MOVE_DESCRIPTION[self._ID]
 		self._originSpot = originSpot
 		self._targetSpot = targetSpot
 		self._card = card
 		self._player = player
-		##debug##print(f'REPR of move in the __init__ : {repr(self)}')
 
 	@property
 	def ID(self) -> str:
@@ -37,32 +40,31 @@ class Move:
 		return self._player
 
 	def __str__(self) -> str:
-		return self._description
+		return self.description
 
 	def __repr__(self) -> str:
 		return f'Move(ID = {self._ID}, originSpot = {self._originSpot}, targetSpot = {self._targetSpot})'
 
-	def updateDescription(self) -> None:
-		##debug##print(f'REPR of move in the updateDescription : {repr(self)}')
-		##debug##print(f'Call to updateDescription for move of type {self._ID} with current description: {self._description}')
+	@property
+	def description(self) -> str:
+		# The description depends on the current state of the target spot (is there a piece to kick?), so it should be rendered
+		# before the move is applied on the board.
 		if self._ID == 'OUT':
-			self._description = f'Play {self._card} to take a piece out and place it in {self._originSpot}.'
+			return f'Play {self._card} to take a piece out and place it in {self._originSpot}.'
 		elif self._ID == 'MOVE':
-			self._description = f'Play {self._card} to move piece currently in spot {self._originSpot} to spot {self._targetSpot}'
+			description = f'Play {self._card} to move piece currently in spot {self._originSpot} to spot {self._targetSpot}'
 			if self._targetSpot.isOccupied:
-				self._description += f' and kick the piece of player {self._targetSpot.occupant.name} which is in the spot.'
-			else:
-				self._description += '.'
+				return description + f' and kick the piece of player {self._targetSpot.occupant.name} which is in the spot.'
+			return description + '.'
 		elif self._ID == 'BACK':
-			self._description = f'Play {self._card} to move piece currently in spot {self._originSpot} back to spot {self._targetSpot}'
+			description = f'Play {self._card} to move piece currently in spot {self._originSpot} back to spot {self._targetSpot}'
 			if self._targetSpot.isOccupied:
-				self._description += f' and kick the piece of player {self._targetSpot.occupant} which is in the spot.'
-			else:
-				self._description += '.'
+				return description + f' and kick the piece of player {self._targetSpot.occupant} which is in the spot.'
+			return description + '.'
 		elif self._ID == 'ENTER':
-			self._description = f'Play {self._card} to move piece currently in spot {self._originSpot} back to house spot {self._targetSpot}.'
+			return f'Play {self._card} to move piece currently in spot {self._originSpot} back to house spot {self._targetSpot}.'
 		elif self._ID == 'SWITCH':
-			self._description = f'Play {self._card} to switch piece in spot {self._originSpot} with piece of player {self._targetSpot.occupant.name} in spot {self._targetSpot}.'
+			return f'Play {self._card} to switch piece in spot {self._originSpot} with piece of player {self._targetSpot.occupant.name} in spot {self._targetSpot}.'
 		elif self._ID == 'SEVEN':
-			self._description = f'Play {self._card} to do a "seven split" : move any of your pieces as you wish a total of 7 times, kicking any piece you meet as you go.'
-		##debug##print(f'End of updateDescription, new description: {self._description}')
\ No newline at end of file
+			return f'Play {self._card} to do a "seven split" : move any of your pieces as you wish a total of 7 times, kicking any piece you meet as you go.'
+		return MOVE_DESCRIPTION[self._ID]
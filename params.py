@@ -5,4 +5,15 @@ NUMBER_OF_PLAYERS = 4
 NUMBER_OF_TEAMS = 2
 SPOTS_PER_REGION = 17
 SPOTS_PER_HOUSE = 4
+MOVE_CACHE_SIZE = 4096
+OUTBOX_SIZE = 256
+DELTA_WINDOW = 512
+JOURNAL_DIR = 'journals'
+JOURNAL_SNAPSHOT_INTERVAL = 64
+CHECKPOINT_PATH = 'checkpoints.sqlite'
+MAX_GAMES = 1000
+LOBBY_TTL = 30 * 60
+IDLE_TIMEOUT = 2 * 60 * 60
+REAPER_INTERVAL = 60
+SIMULATION_MAX_ROUNDS = 300
 MOVE_DESCRIPTION = {'OUT' : 'Take a piece out.', 'MOVE' : f'Move x time(s) forward.', 'SWITCH' : f'Switch piece with piece of player x in spot x.', 'CHANGE_CARD' : 'Pick another card', 'BACK' : f'Move 4 spots backward.', 'ENTER' : f'Enter house spot number x.', 'SEVEN':f'Play a seven split.'}
\ No newline at end of file
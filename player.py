@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import random
 
-from cards import Card
+from cards import Card, decodeCard
 from hand import Hand
+from seven import SevenSplitEnumerator
 
 import json
 
@@ -18,10 +19,9 @@ class Player:
 		self._hand = Hand(player = self)
 		self._active = False
 		self._isDealer = False
-		self._piecesOnTheBoard = 0
 		self._gameSession = gameSession
 		self._router = router
-		self.board = None
+		self._board = None
 
 	def __str__(self) -> str:
 		s = f'{self._name} in team {self._team} playing {self._color}'
@@ -39,6 +39,10 @@ class Player:
 		print(f"[Player] Waiting for input from {self._name}...")
 		return await self._router.wait_for_input(self._id)
 		
+	@property
+	def id(self) -> str:
+		return self._id
+
 	@property
 	def name(self) -> str:
 		return self._name
@@ -70,24 +74,27 @@ class Player:
 
 	@property
 	def piecesOnTheBoard(self) -> int:
-		return self._piecesOnTheBoard
-
-	def addAPieceOnTheBoard(self) -> None:
-		self._piecesOnTheBoard += 1
-
-	def removeAPieceFromTheBoard(self) -> None:
-		self._piecesOnTheBoard -= 1
+		# read from the board, which keeps track of the pieces of every color
+		if self._board is None:
+			return 0
+		return self._board.getNumberOfPiecesOnTheBoard(self._color)
 
 	def setBoard(self, board) -> None:
 		self._board = board
 
-	async def setHand(self, hand : Hand) -> None:
+	def assignHand(self, hand : Hand) -> None:
 		self._hand = hand
+
+	async def setHand(self, hand : Hand) -> None:
+		self.assignHand(hand)
 		await self.send_message_to_user({"type": "draw", "playerId": self._name, "cards": [c.json for c in self._hand.cards]})
 		await self.send_message_to_user({"type": "reveal", "playerId": self._name, "cards": [c.json for c in self._hand.cards]})
 
 	async def sendHandAgain(self) -> None:
-		await self.send_message_to_user({"type": "reveal", "playerId": self._name, "cards": [c.json for c in self._hand.cards]})
+		await self.send_message_to_user(self.handMessage())
+
+	def handMessage(self) -> dict:
+		return {"type": "reveal", "playerId": self._name, "cards": [c.json for c in self._hand.cards]}
 
 	def setDealer(self) -> None:
 		self._isDealer = True
@@ -98,18 +105,15 @@ class Player:
 	async def getCardChoiceFromPlayer(self) -> Card:
 		await self.send_message_to_user({"type": "query-card", "msg": 'What card do you want to play?'})
 		cardChoice = await self.get_input_from_prompt('What card do you want to play?')
-		while not cardChoice or (not 'type' in cardChoice.keys()) or (cardChoice['type'] != 'card_selection') or (not Card(cardChoice['suit'], cardChoice['value']) in self._hand.cards):
+		while not self.isValidCardChoice(cardChoice):
 			cardChoice = await self.get_input_from_prompt('What card do you want to play?')
-		chosenCard = Card(cardChoice['suit'], cardChoice['value'])
+		chosenCard = decodeCard(cardChoice)
 		print(f'Card chosen by {self._name} for his/her next move: {chosenCard}')
 		return chosenCard
 
 	async def getMoveChoiceFromPlayer(self, options : list[Move]) -> Move:
 		##debug##print(f'{[repr(move) for move in options]}')
 
-		for move in options:
-			move.updateDescription()
-
 		cardChoice = await self.getCardChoiceFromPlayer()
 		print(f'[getMoveChoiceFromPlayer] selected card: {str(cardChoice)} - {id(cardChoice)} - {type(cardChoice)}')
 		moveChoice = None
@@ -118,7 +122,7 @@ class Player:
 			possibleMoves = [move for move in options if move.card == cardChoice]
 			print('[getMoveChoiceFromPlayer] Possible moves:')
 			for m in possibleMoves:
-				print(f'[getMoveChoiceFromPlayer] {str(m)} ---- origin: {m.originSpot} {id(m.originSpot)}, target: {m.targetSpot} {id(m.targetSpot)}, card: {m.card} {id(m.card)}')
+				print(f'[getMoveChoiceFromPlayer] {repr(m)} ---- origin: {m.originSpot} {id(m.originSpot)}, target: {m.targetSpot} {id(m.targetSpot)}, card: {m.card} {id(m.card)}')
 			if len(possibleMoves) == 0:
 				await self.send_message_to_user({"type": "reject-card-selection", "msg": f'You cannot play that card right now!'})
 				cardChoice = await self.getCardChoiceFromPlayer()
@@ -156,71 +160,71 @@ class Player:
 	async def getOriginChoiceFromPlayer(self, possibleOrigins) -> Spot:
 		await self.send_message_to_user({"type": "query-origin", "msg": 'What piece do you want to play this card on?', "originOptions": [str(o) for o in possibleOrigins]})
 		spotChoice = await self.get_input_from_prompt("What piece do you want to play this card on?")
-		while not spotChoice or (not 'type' in spotChoice.keys()) or (spotChoice['type'] != 'spot_selection') or (not (self._board.getSpotById(spotChoice['result']) in self._board.getOccupiedSpotsOnTheBoard(self._name) or (self._board.getSpotById(spotChoice['result']) == self._board.getFirstSpot(self._color)))):
-			data = await self.get_input_from_prompt("What piece do you want to play this card on?")
-		origin = self._board.getSpotById(spotChoice['result'])
+		while not self.isValidOriginChoice(spotChoice, possibleOrigins):
+			spotChoice = await self.get_input_from_prompt("What piece do you want to play this card on?")
+		origin = self._board.getSpotById(spotChoice['result']) or self._board.getHouseById(spotChoice['result'])
 		return origin
 
+	def isValidOriginChoice(self, spotChoice, possibleOrigins) -> bool:
+		if not spotChoice or (not 'type' in spotChoice.keys()) or (spotChoice['type'] != 'spot_selection'):
+			return False
+		spot = self._board.getSpotById(spotChoice['result']) or self._board.getHouseById(spotChoice['result'])
+		# The origin must be one of those offered: after a takeover, they hold the teammate's pieces (or are the teammate's exit spot)
+		return spot is not None and spot in possibleOrigins
 
 	async def getTargetChoiceFromPlayer(self, possibleTargets) -> Spot:
 		await self.send_message_to_user({"type": "query-target", "msg": 'Where do you want to move this piece?', "targetOptions": [str(t) for t in possibleTargets]})
 		spotChoice = await self.get_input_from_prompt("Where do you want to move this piece?")
-		while not spotChoice or  (not 'type' in spotChoice.keys()) or (spotChoice['type'] != 'spot_selection') or not (self._board.getSpotById(spotChoice['result'])):
+		while not self.isValidTargetChoice(spotChoice, possibleTargets):
 			spotChoice = await self.get_input_from_prompt("Where do you want to move this piece?")
-		target = self._board.getSpotById(spotChoice['result'])
+		target = self._board.getSpotById(spotChoice['result']) or self._board.getHouseById(spotChoice['result'])
 		return target
 
-	async def getSevenMoveFromPlayer(self, board : Board) -> None:
-		counter = 0
-		moves = []
-		board.saveState()
-		await self.send_message_to_user({"type": "log", "msg": 'Please select the moves you want to do in your seven-split:'})
-		# This loop will display all the 'one-move' options to the user, who will have to choose one seven times
-		while counter < 7:
-			moveOptions = board.getMoveOptions(self, Card('', '1'))
-			##debug##print(f'moveOptions provided to user : {moveOptions}')
-			moveChoice = self.getMoveChoiceFromPlayer(moveOptions)
-
-			# the move effect on the board are applied as if the move was really going to happen, but it's ok since the board.saveState() was called earlier
-			# and so the board can be restored later
-			moveChoice.originSpot.setEmpty()
-			moveChoice.targetSpot.setOccupant(self)
-			# we don't actually kick the users from the spots they occupy because that would mess up the pieceOnTheBoard counter
-			# we store the move and go on seven times
-			moves.append(moveChoice)
-			counter += 1
-		await self.send_message_to_user({"type": "log", "msg": f'Selected moves for seven split : {moves}'})
-		confirmation = await self.get_input_from_prompt('Please confirm that you wish to do this seven-split this way? (Y/N) ')
-		while confirmation not in ['Y', 'N']:
-			confirmation = await self.get_input_from_prompt('Please confirm that you wish to do this seven-split this way? (Y/N) ')
-		# we restore the board state before re-applying all the changes, but this time kicking player along the way
-		board.restoreState()
-		# if the user confirms we proceed
-		if confirmation == 'Y':
-			for move in moves:
-				board.getSpot(move.originSpot.color, move.originSpot.number).setEmpty()
-				kickedPlayer = board.getSpot(move.targetSpot.color, move.targetSpot.number).setOccupant(self)
-				if not kickedPlayer is None:
-					kickedPlayer.removeAPieceFromTheBoard()
-		# if the user does not confirm we simply call the method again to offer the possibility to choose differently
-		# (the board was already restored so we're good)
-		else:
-			await self.getSevenMoveFromPlayer(board)
+	def isValidTargetChoice(self, spotChoice, possibleTargets) -> bool:
+		if not spotChoice or (not 'type' in spotChoice.keys()) or (spotChoice['type'] != 'spot_selection'):
+			return False
+		spot = self._board.getSpotById(spotChoice['result']) or self._board.getHouseById(spotChoice['result'])
+		# as for the origin, only one of the targets offered can be chosen
+		return spot is not None and spot in possibleTargets
+
+	async def getSevenMoveFromPlayer(self, board : Board, piecesOwner : Player = None) -> SevenSplit:
+		# All the distinct ways of playing the seven are computed up front and offered to the player as a single choice.
+		# The chosen split is returned, it is up to the caller to apply it (see engine.playMove).
+		outcomes = SevenSplitEnumerator(board, piecesOwner or self).outcomes()
+		if len(outcomes) == 1:
+			return outcomes[0]
+		options = '\n'.join(f'{index}: {outcome}' for index, outcome in enumerate(outcomes))
+		prompt = f'Please select the seven-split you want to play (type its number):\n{options}'
+		choice = await self.get_input_from_prompt(prompt)
+		while not self.isValidIndexChoice(choice, len(outcomes)):
+			choice = await self.get_input_from_prompt(prompt)
+		return outcomes[int(choice['msg'].strip())]
+
+	def isValidCardChoice(self, cardChoice) -> bool:
+		if not cardChoice or (not 'type' in cardChoice.keys()) or (cardChoice['type'] != 'card_selection'):
+			return False
+		card = decodeCard(cardChoice)
+		return card is not None and card in self._hand.cards
+
+	def isValidIndexChoice(self, choice, numberOfOptions : int) -> bool:
+		if not choice or (not 'type' in choice.keys()) or (choice['type'] != 'text_input'):
+			return False
+		index = choice['msg'].strip()
+		return index.isdigit() and int(index) < numberOfOptions
 
 	def discard(self, card) -> None:
 		self._hand.discardFromHand(card)
 
 	async def requestCardExchange(self) -> Card:
 		cardChoice = await self.get_input_from_prompt('Please choose a card to give to your team-mate.')
-		while not cardChoice or (not 'type' in cardChoice.keys()) or (cardChoice['type'] != 'card_selection') or (not Card(cardChoice['suit'], cardChoice['value']) in self._hand.cards):
+		while not self.isValidCardChoice(cardChoice):
 			cardChoice = await self.get_input_from_prompt('Please choose a card to give to your team-mate.')
-		chosenCard = Card(cardChoice['suit'], cardChoice['value'])
+		chosenCard = decodeCard(cardChoice)
 		print(f'Card chosen by {self._name} for card exchange: {chosenCard}')
 		return chosenCard
 
-	async def switchCard(self, card1, card2) -> None:
-		self._hand.discardFromHand(card1)
-		self._hand.addToHand(card2)
+	async def notifyCardSwitch(self, card1, card2) -> None:
+		# The cards themselves are switched by engine.exchangeCards(), this only lets the player know about it
 		await self.send_message_to_user({"type": "receive-card-from-friend", "value": card2.value, "suit": card2.suit})
 		await self.send_message_to_user({"type": "log", "msg": f"Successfully given {card1.suit}{card1.value} to your team-mate who has given you {card2.suit}{card2.value} in exchange. Round will start as soon as the other team exchanges cards.\n"})
 
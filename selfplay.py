@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import engine
+from cards import Deck
+from hand import BitHand
+from player import Player
+from params import *
+
+# Self-play tournament runner: plays full games between pluggable policies through the synchronous engine (no websocket, no
+# router, no event loop), spread over a pool of processes, and streams one JSON line of results per game.
+#
+#     python selfplay.py --games 100000 --policies greedy,random --workers 8 --output results.jsonl
+
+
+class Policy:
+	# Makes the decisions of a player, at random unless a subclass knows better. Every method gets the random generator of the
+	# game so that games are reproducible from their seed.
+	def chooseMove(self, state : engine.TableState, moves : list[Move], rng : random.Random) -> Move:
+		return rng.choice(moves)
+
+	def chooseSevenSplit(self, state : engine.TableState, splits : list[SevenSplit], rng : random.Random) -> SevenSplit:
+		return rng.choice(splits)
+
+	def chooseExchangeCard(self, player : Player, rng : random.Random) -> Card:
+		return rng.choice(player.hand.cards)
+
+
+class RandomPolicy(Policy):
+	pass
+
+
+class FirstMovePolicy(Policy):
+	def chooseMove(self, state : engine.TableState, moves : list[Move], rng : random.Random) -> Move:
+		return moves[0]
+
+	def chooseSevenSplit(self, state : engine.TableState, splits : list[SevenSplit], rng : random.Random) -> SevenSplit:
+		return splits[0]
+
+	def chooseExchangeCard(self, player : Player, rng : random.Random) -> Card:
+		return player.hand.cards[0]
+
+
+class GreedyPolicy(Policy):
+	# Enters a house whenever possible, then kicks, then takes a piece out, then goes as far as possible. A house is only
+	# entered when the ones past it are filled: a piece in a house never moves again, so the houses past it could never be.
+	def _score(self, state : engine.TableState, move : Move) -> int:
+		if move.ID == 'ENTER':
+			if all(house.isOccupied for house in state.board.getHousesByColor(move.targetSpot.color)[move.targetSpot.number + 1:]):
+				return 4
+			return -1
+		if move.ID in ['MOVE', 'BACK'] and move.targetSpot.isOccupied and move.targetSpot.occupant.team != move.player.team:
+			return 3
+		if move.ID == 'OUT':
+			return 2
+		if move.ID == 'MOVE':
+			return 1
+		return 0
+
+	def chooseMove(self, state : engine.TableState, moves : list[Move], rng : random.Random) -> Move:
+		scores = [self._score(state, move) for move in moves]
+		bestScore = max(scores)
+		return rng.choice([move for move, score in zip(moves, scores) if score == bestScore])
+
+	def chooseExchangeCard(self, player : Player, rng : random.Random) -> Card:
+		# keeps the cards which can take a piece out
+		cards = [card for card in player.hand.cards if card.value not in ['A', 'K']] or player.hand.cards
+		return rng.choice(cards)
+
+
+POLICIES = {'random': RandomPolicy, 'first': FirstMovePolicy, 'greedy': GreedyPolicy}
+
+# Number of cards dealt to each player for each of the three rounds of a deck (see Game.play)
+ROUNDS = [5, 4, 4]
+
+
+def canFillHouses(state : engine.TableState, color : str) -> bool:
+	# A house can only be entered while the ones before it are empty, and a piece in a house never moves again: once an
+	# empty house has a filled one before it, it stays empty for good.
+	houses = state.board.getHousesByColor(color)
+	return not any(not house.isOccupied and any(before.isOccupied for before in houses[:number]) for number, house in enumerate(houses))
+
+
+def canStillBeWon(state : engine.TableState) -> bool:
+	return any(all(canFillHouses(state, player.color) for player in state.players if player.team == team) for team in {player.team for player in state.players})
+
+
+def playGame(gameIndex : int, seed : int, policyNames : list[str], maxRounds : int = SIMULATION_MAX_ROUNDS) -> dict:
+	# Plays one game until it is won and returns its results. policyNames gives the policy of each seat. As in Game.play, the
+	# deck is reshuffled and the next player deals after every third round. A game is stopped without a winner when no team
+	# can fill its houses any more ("stalled"), or when it is still not won after maxRounds rounds ("capped").
+	rng = random.Random(seed)
+	startTime = time.perf_counter()
+	policies = [POLICIES[name]() for name in policyNames]
+	players = [Player(f'bot{seat}', f'bot{seat}', str(seat % NUMBER_OF_TEAMS), COLORS[seat]) for seat in range(NUMBER_OF_PLAYERS)]
+	policyOf = {player.name: policy for player, policy in zip(players, policies)}
+	turns = 0
+	folds = 0
+	kicks = 0
+	rounds = 0
+
+	# the board prints its creation, which would end up in the middle of the results
+	with contextlib.redirect_stdout(io.StringIO()):
+		state = engine.newTable(COLORS, players, Deck(seed))
+		state.handClass = BitHand
+		while not state.isFinished and rounds < maxRounds and canStillBeWon(state):
+			numberOfCards = ROUNDS[rounds % len(ROUNDS)]
+			if rounds > 0 and rounds % len(ROUNDS) == 0:
+				state.deck.reset()
+				engine.nextDealer(state)
+			engine.startRound(state)
+			engine.dealHands(state, numberOfCards)
+			for player in state.players:
+				teammate = state.getTeammate(player)
+				if player.name < teammate.name:
+					card1 = policyOf[player.name].chooseExchangeCard(player, rng)
+					card2 = policyOf[teammate.name].chooseExchangeCard(teammate, rng)
+					engine.exchangeCards(state, player, card1, teammate, card2)
+
+			while not engine.isRoundFinished(state):
+				engine.startTurn(state)
+				player = state.activePlayer
+				if player.hand.size > 0:
+					moves = engine.legalMoves(state)
+					move = None
+					sevenSplit = None
+					if moves:
+						move = policyOf[player.name].chooseMove(state, moves, rng)
+						if move.ID == 'SEVEN':
+							sevenSplit = policyOf[player.name].chooseSevenSplit(state, engine.sevenSplits(state, move), rng)
+					else:
+						folds += 1
+					# kicking a piece is the only way for a player to lose a piece
+					piecesBefore = sum(p.piecesOnTheBoard for p in state.players)
+					engine.playMove(state, move, sevenSplit)
+					if move is not None and move.ID != 'OUT':
+						kicks += piecesBefore - sum(p.piecesOnTheBoard for p in state.players)
+					turns += 1
+				engine.endTurn(state)
+			rounds += 1
+
+	winner = None
+	if state.winners:
+		winner = state.winners[0].team
+	return {"game": gameIndex, "seed": seed, "policies": policyNames, "winner": winner, "rounds": rounds, "stalled": not state.isFinished and not canStillBeWon(state), "capped": not state.isFinished and rounds >= maxRounds, "turns": turns, "folds": folds, "kicks": kicks, "wall_time": time.perf_counter() - startTime}
+
+
+def _playGameTask(task : Tuple[int, int, list[str], int]) -> dict:
+	return playGame(*task)
+
+
+def main(argv : list[str] = None) -> None:
+	parser = argparse.ArgumentParser(prog='toc-selfplay', description='Play games between bots and write the results as JSON lines.')
+	parser.add_argument('--games', type=int, default=100, help='number of games to play')
+	parser.add_argument('--seed', type=int, default=0, help='seed of the first game, game i is played with seed + i')
+	parser.add_argument('--policies', default='random,random', help=f'comma-separated policies, one per team or one per seat, among: {", ".join(POLICIES)}')
+	parser.add_argument('--workers', type=int, default=None, help='number of worker processes (defaults to the number of CPUs)')
+	parser.add_argument('--max-rounds', type=int, default=SIMULATION_MAX_ROUNDS, help='rounds after which a game not won yet is stopped')
+	parser.add_argument('--chunksize', type=int, default=16, help='number of games sent to a worker at once')
+	parser.add_argument('--output', default=None, help='JSONL file to write the results to (defaults to the standard output)')
+	args = parser.parse_args(argv)
+
+	policyNames = args.policies.split(',')
+	if len(policyNames) == NUMBER_OF_TEAMS:
+		policyNames = [policyNames[seat % NUMBER_OF_TEAMS] for seat in range(NUMBER_OF_PLAYERS)]
+	if len(policyNames) != NUMBER_OF_PLAYERS or any(name not in POLICIES for name in policyNames):
+		parser.error(f'--policies expects {NUMBER_OF_TEAMS} or {NUMBER_OF_PLAYERS} names among: {", ".join(POLICIES)}')
+
+	tasks = ((gameIndex, args.seed + gameIndex, policyNames, args.max_rounds) for gameIndex in range(args.games))
+	output = open(args.output, 'w') if args.output else sys.stdout
+	try:
+		with ProcessPoolExecutor(max_workers=args.workers) as executor:
+			for result in executor.map(_playGameTask, tasks, chunksize=args.chunksize):
+				output.write(json.dumps(result) + '\n')
+				output.flush()
+	finally:
+		if output is not sys.stdout:
+			output.close()
+
+
+if __name__ == '__main__':
+	main()
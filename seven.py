@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from cards import Card
+
+SEVEN_STEPS = 7
+
+# Special card which cannot be played by a player, but gives the "one-step" moves a seven split is made of.
+ONE_STEP_CARD = Card('', '1')
+
+
+class SevenSplit:
+	# One way of playing a seven: the ordered one-step moves, and the positions of the pieces it ends up with (which is what
+	# makes two splits different, the order in which the steps are played is irrelevant as long as they end up the same way).
+	def __init__(self, moves : list[Move], finalKey : int):
+		self._moves = moves
+		self._finalKey = finalKey
+
+	def __str__(self) -> str:
+		# consecutive steps of the same piece are shown as a single move
+		parts = []
+		for move in self._moves:
+			if parts and parts[-1][1] == move.originSpot:
+				parts[-1][1] = move.targetSpot
+			else:
+				parts.append([move.originSpot, move.targetSpot])
+		return ', '.join(f'{origin} -> {target}' for origin, target in parts)
+
+	@property
+	def moves(self) -> list[Move]:
+		return self._moves
+
+	@property
+	def finalKey(self) -> int:
+		return self._finalKey
+
+
+class SevenSplitEnumerator:
+	# Enumerates every distinct legal outcome of a seven split for a player, i.e. every way of splitting the 7 steps among
+	# the player's pieces (house entries and kicks included). The one-step moves are applied on the board and undone as the
+	# search goes. Intermediate positions reached through different orders of the same steps (transpositions) are only
+	# explored once, thanks to a memo keyed on the state of the board and the number of remaining steps.
+	def __init__(self, board : Board, player : Player):
+		self._board = board
+		self._player = player
+
+	def _stateKey(self) -> int:
+		return self._board.state.hash
+
+	def outcomes(self) -> list[SevenSplit]:
+		outcomes = {}
+		self._explore(SEVEN_STEPS, [], set(), outcomes)
+		return list(outcomes.values())
+
+	def _explore(self, remaining : int, path : list[Move], seen : set, outcomes : dict) -> None:
+		key = self._stateKey()
+		if remaining == 0:
+			if key not in outcomes:
+				outcomes[key] = SevenSplit(path[:], key)
+			return
+		if (key, remaining) in seen:
+			return
+		seen.add((key, remaining))
+
+		for move in self._board.getMoveOptions(self._player, ONE_STEP_CARD):
+			token = self._board.applyMove(move)
+			path.append(move)
+			self._explore(remaining - 1, path, seen, outcomes)
+			path.pop()
+			self._board.undo(token)
+
+	def isFeasible(self) -> bool:
+		return self._isFeasible(SEVEN_STEPS, {})
+
+	def _isFeasible(self, remaining : int, memo : dict) -> bool:
+		# Same search as above, but stops as soon as one complete split is found.
+		if remaining == 0:
+			return True
+		key = (self._stateKey(), remaining)
+		if key in memo:
+			return memo[key]
+		result = False
+		for move in self._board.getMoveOptions(self._player, ONE_STEP_CARD):
+			token = self._board.applyMove(move)
+			result = self._isFeasible(remaining - 1, memo)
+			self._board.undo(token)
+			if result:
+				break
+		memo[key] = result
+		return result
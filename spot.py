@@ -1,27 +1,35 @@
 from __future__ import annotations
 from typing import Optional
 
+from boardstate import BoardState, EMPTY, spotId, houseId
 from player import Player
 
 
 class Spot:
-	def __init__(self, color : str, number : int):
+	def __init__(self, color : str, number : int, state : BoardState = None, index : int = None):
 		self._color = color
 		self._number = number
-		self._isOccupied = False
-		self._isBlocking = False
-		self._occupant = None
+		self._id = self._makeId(color, number)
+		if state is None:
+			# A spot created outside of a Board gets its own (one color) state to live in.
+			state = BoardState([color])
+			index = number
+		self._state = state
+		self._index = index
+
+	def _makeId(self, color : str, number : int) -> str:
+		return spotId(color, number)
 
 	def __str__(self) -> str:
-		return 'spot-'+self._color+'-'+str(self._number)
+		return self._id
 
 	def __eq__(self, other) -> bool:
 		if isinstance(other, Spot):
-			return str(self) == str(other)
+			return self._id == other._id
 		return False
 
 	def __hash__(self):
-		return hash(str(self))
+		return hash(self._id)
 
 	@property
 	def color(self) -> str:
@@ -31,38 +39,58 @@ class Spot:
 	def number(self) -> int:
 		return self._number
 
+	@property
+	def index(self) -> int:
+		return self._index
+
 	@property
 	def isOccupied(self) -> bool:
-		return self._isOccupied
+		return self._state.spotOwner[self._index] != EMPTY
 
 	@property
 	def isBlocking(self) -> bool:
-		return self._isBlocking
+		return self._state.spotBlocking[self._index] == 1
 
 	@property
 	def occupant(self) -> Player:
-		return self._occupant
+		return self._state.owner(self._state.spotOwner[self._index])
 
 	def setOccupant(self, player : Player, isOwnPlayerTakingAPieceOut : bool = False) -> Optional[Player]:
-		# The 'result' variable is returned with the previous occupant of the spot, if there is one. This is used by the game.py logic to decrease the counter keeping track of how many pieces any given player has on the board. 
-		result = None
-		if self._isOccupied:
-			result = self._occupant
-		
-		self._occupant = player
-		self._isOccupied = True
+		# The 'result' variable is returned with the previous occupant of the spot, if there is one. This is used by the game.py logic to decrease the counter keeping track of how many pieces any given player has on the board.
+		result = self.occupant
 
 		if isOwnPlayerTakingAPieceOut:
-			self._isBlocking = True
+			blocking = 1
+		else:
+			blocking = self._state.spotBlocking[self._index]
+		self._state.setSpot(self._index, self._state.ownerIndex(player), blocking)
 
 		return result
 
 	def setEmpty(self) -> None:
-		self._occupant = None
-		self._isOccupied = False
-		self._isBlocking = False
+		self._state.setSpot(self._index, EMPTY, 0)
 
 
 class House(Spot):
-	def __str__(self) -> str:
-		return 'house-'+self._color+'-'+str(self._number)
\ No newline at end of file
+	def _makeId(self, color : str, number : int) -> str:
+		return houseId(color, number)
+
+	@property
+	def isOccupied(self) -> bool:
+		return self._state.houseOwner[self._index] != EMPTY
+
+	@property
+	def isBlocking(self) -> bool:
+		return False
+
+	@property
+	def occupant(self) -> Player:
+		return self._state.owner(self._state.houseOwner[self._index])
+
+	def setOccupant(self, player : Player, isOwnPlayerTakingAPieceOut : bool = False) -> Optional[Player]:
+		result = self.occupant
+		self._state.setHouse(self._index, self._state.ownerIndex(player))
+		return result
+
+	def setEmpty(self) -> None:
+		self._state.setHouse(self._index, EMPTY)